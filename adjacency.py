@@ -0,0 +1,114 @@
+from hashlib import sha1
+
+import numpy as np
+
+
+class SparseAdjacency(object):
+    """
+    Adjacency of the sensor network in compressed sparse row (CSR) format.
+
+    Neighbors of the sensor i are indices[indptr[i]:indptr[i + 1]], sorted
+    in ascending order. The network is undirected, so every link is stored
+    in the rows of both sensors; links of a sensor with itself are not stored.
+    """
+
+    def __init__(self, indptr, indices, coords=None):
+        """
+        :param indptr: array of row offsets, length n+1
+        :param indices: array of neighbors of all sensors
+        :param coords: coordinates of sensors, if the network has them
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.coords = coords
+        self._fingerprint = None
+
+    @classmethod
+    def from_edges(cls, n, edges, coords=None):
+        """
+        Builds adjacency from the list of links
+        :param n: number of sensors with base station
+        :param edges: pairs (i, j), in any order and with repeats
+        :param coords: coordinates of sensors
+        :return: SparseAdjacency
+        """
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        keys = np.unique(np.concatenate((edges[:, 0] * n + edges[:, 1],
+                                         edges[:, 1] * n + edges[:, 0])))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // n, minlength=n), out=indptr[1:])
+        return cls(indptr, (keys % n).astype(np.int32), coords)
+
+    @classmethod
+    def from_dense(cls, matrix):
+        """
+        Builds adjacency from the adjacency matrix
+        :param matrix: list of lists or numpy array nxn
+        :return: SparseAdjacency
+        """
+        matrix = np.asarray(matrix)
+        return cls.from_edges(len(matrix), np.column_stack(np.nonzero(matrix)))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def neighbors(self, i):
+        """Returns array of neighbors of the sensor i"""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def degrees(self):
+        """Returns array with number of neighbors of each sensor"""
+        return np.diff(self.indptr)
+
+    def has_edge(self, i, j):
+        """Checks that sensors i and j are linked"""
+        row = self.neighbors(i)
+        k = np.searchsorted(row, j)
+        return k < len(row) and row[k] == j
+
+    def edges(self):
+        """Returns array of links mx2, each link once as (i, j), i < j"""
+        rows = np.repeat(np.arange(len(self), dtype=np.int32), self.degrees())
+        mask = rows < self.indices
+        return np.column_stack((rows[mask], self.indices[mask]))
+
+    def fingerprint(self):
+        """
+        Returns hex digest of the topology, equal for equal adjacencies.
+        The arrays are treated as immutable, so the digest is computed once
+        """
+        if self._fingerprint is None:
+            digest = sha1(np.ascontiguousarray(self.indptr, dtype=np.int64).tobytes())
+            digest.update(np.ascontiguousarray(self.indices, dtype=np.int64).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def to_dense(self):
+        """Returns adjacency matrix as list of lists"""
+        matrix = np.zeros((len(self), len(self)), dtype=int)
+        edges = self.edges()
+        matrix[edges[:, 0], edges[:, 1]] = 1
+        matrix[edges[:, 1], edges[:, 0]] = 1
+        return matrix.tolist()
+
+    def to_networkx(self):
+        """Returns networkx graph with weight 1 for every link"""
+        import networkx as nx
+
+        graph = nx.Graph()
+        graph.add_nodes_from(range(len(self)))
+        graph.add_edges_from(self.edges().tolist(), weight=1)
+        return graph
+
+
+def as_adjacency(adj):
+    """
+    Input adapter for topologies: dense adjacency matrices (list of lists or
+    numpy array) are converted to SparseAdjacency, SparseAdjacency is returned as is
+    :param adj: topology of the sensor network
+    :return: SparseAdjacency
+    """
+    if isinstance(adj, SparseAdjacency):
+        return adj
+    return SparseAdjacency.from_dense(adj)
@@ -0,0 +1,179 @@
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+import main
+from graph_gen import graph_generator, grid_generator, tree_generator
+from routing import RoutingGraph
+
+BenchResult = namedtuple('BenchResult', ['name', 'size', 'load', 'seconds', 'peak_kb'])
+Regression = namedtuple('Regression', ['name', 'size', 'load', 'metric', 'value', 'baseline', 'ratio'])
+
+
+def measure(function, setup=None, repeats=3, check=None):
+    """
+    Время и память одного вызова.
+    Время - наименьшее по repeats вызовам со сборщиком мусора, отключенным на время вызова,
+    как в timeit. Пиковая память считается отдельным вызовом под tracemalloc, так как он
+    замедляет выполнение. Подготовка setup не измеряется. Если задан check, результат
+    каждого вызова проверяется, чтобы не замерить вызов, который ничего не сделал.
+    :param function: функция от результата setup
+    :param setup: функция, которая готовит аргумент для каждого вызова (например, новый RoutingGraph)
+    :param repeats: количество вызовов для измерения времени
+    :param check: функция от результата вызова, False - вызов не выполнил работу, выкидывается ValueError
+    :return: время в секундах и пиковая память в КБ
+    """
+    setup = setup or (lambda: None)
+    check = check or (lambda result: True)
+    seconds = float('inf')
+    for _ in range(repeats):
+        argument = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = function(argument)
+            seconds = min(seconds, time.perf_counter() - start)
+        finally:
+            gc.enable()
+        if not check(result):
+            raise ValueError("Measured call did no work")
+
+    argument = setup()
+    tracemalloc.start()
+    try:
+        result = function(argument)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if not check(result):
+        raise ValueError("Measured call did no work")
+    return seconds, peak / 1024
+
+
+def _grid_side(n):
+    """Нечетная сторона решетки, у которой число сенсоров вместе с БС ближе всего к n + 1"""
+    return max(1, int(round((np.sqrt(n + 1) - 1) / 2)) * 2 + 1)
+
+
+def benchmark_cases(n, load, seed=0, num_of_frames=20):
+    """
+    Замеры для сети из n сенсоров
+    Генераторы замеряются на n сенсорах (решетка - на ближайшей по размеру), маршруты,
+    расписание и моделирование - на graph_generator(n, seed). При нагрузке load в каждом сенсоре
+    load сообщений, при моделировании вероятность появления сообщения - load / 4 от пропускной
+    способности БС 1 / n.
+    :param n: количество сенсоров без БС
+    :param load: уровень нагрузки
+    :param seed: seed генераторов и моделирования
+    :param num_of_frames: количество фреймов моделирования
+    :return: список (имя, функция, setup, check) для measure; генераторы - только при load, равном 1
+    """
+    adj = graph_generator(n, seed=seed)
+    sens_buf = [0] + [load] * n
+    frame = main.rasp_create(adj, balance=True)
+    prb = load / (4.0 * n)
+
+    def built(result):
+        return len(result) > 1
+
+    def routed(result):
+        return len(result) == load * n
+
+    cases = []
+    if load == 1:
+        side = _grid_side(n)
+        cases += [
+            ('grid_generator', lambda _: grid_generator(side), None, built),
+            ('tree_generator', lambda _: tree_generator(n, seed=seed), None, built),
+            ('graph_generator', lambda _: graph_generator(n, seed=seed), None, built),
+        ]
+    cases += [
+        # routes_create изменяет веса графа, поэтому граф строится заново перед каждым вызовом
+        ('routes_create', lambda graph: main.routes_create(graph, sens_buf, balance=False),
+         lambda: RoutingGraph(adj), routed),
+        ('routes_create_balance', lambda graph: main.routes_create(graph, sens_buf, balance=True),
+         lambda: RoutingGraph(adj), routed),
+        # rasp_create переносит сообщения sens_buf на БС, поэтому каждому вызову - своя копия
+        ('rasp_create', lambda buf: main.rasp_create(adj, buf, balance=True), lambda: list(sens_buf),
+         lambda result: sum(map(len, result)) == load * n),
+        ('sens_graph_with_prob', lambda _: main.sens_graph_with_prob(
+            adj, prb=prb, num_of_frames=num_of_frames, frame=frame, rng=np.random.default_rng(seed)), None,
+         lambda result: result > 0),
+    ]
+    return cases
+
+
+def run_benchmarks(sizes=(100, 300, 1000), loads=(1, 2), seed=0, repeats=3, num_of_frames=20):
+    """
+    Замеряет время и память всех функций на сетях разного размера и при разной нагрузке.
+    Все входные данные строятся от seed, поэтому запуски с одними параметрами сравнимы
+    :param sizes: количества сенсоров без БС
+    :param loads: уровни нагрузки, см. benchmark_cases
+    :param seed: seed генераторов и моделирования
+    :param repeats: количество вызовов для измерения времени
+    :param num_of_frames: количество фреймов моделирования
+    :return: словарь для JSON: параметры запуска и окружение в 'meta', BenchResult в 'results'
+    """
+    results = []
+    for n in sizes:
+        for load in loads:
+            for name, function, setup, check in benchmark_cases(n, load, seed, num_of_frames):
+                seconds, peak_kb = measure(function, setup, repeats, check)
+                results.append(BenchResult(name, n, load, seconds, peak_kb))
+    meta = dict(sizes=list(sizes), loads=list(loads), seed=seed, repeats=repeats, num_of_frames=num_of_frames,
+                python=platform.python_version(), numpy=np.__version__, machine=platform.machine())
+    return dict(meta=meta, results=[result._asdict() for result in results])
+
+
+def save_results(path, report):
+    """Сохраняет результаты run_benchmarks в JSON"""
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def load_results(path):
+    """Загружает результаты run_benchmarks из JSON"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(report, baseline, tolerance=0.25, min_seconds=5e-3):
+    """
+    Ищет регрессии относительно сохраненного базового запуска
+    :param report: результаты run_benchmarks
+    :param baseline: базовые результаты run_benchmarks
+    :param tolerance: допустимое относительное ухудшение времени и памяти
+    :param min_seconds: время, ниже которого замер слишком шумный и не сравнивается
+    :return: список Regression; замеры, которых нет в базовом запуске, не сравниваются
+    """
+    base = {(item['name'], item['size'], item['load']): item for item in baseline['results']}
+    regressions = []
+    for item in report['results']:
+        old = base.get((item['name'], item['size'], item['load']))
+        if old is None:
+            continue
+        for metric, floor in (('seconds', min_seconds), ('peak_kb', 0)):
+            if old[metric] > floor and item[metric] > old[metric] * (1 + tolerance):
+                regressions.append(Regression(item['name'], item['size'], item['load'], metric,
+                                              item[metric], old[metric], item[metric] / old[metric]))
+    return regressions
+
+
+if __name__ == "__main__":
+    # python benchmarks.py [результаты.json [базовые.json]]
+    out_path = sys.argv[1] if len(sys.argv) > 1 else 'benchmarks.json'
+    report = run_benchmarks()
+    save_results(out_path, report)
+    for result in report['results']:
+        print("{name:<22} n={size:<6} нагрузка {load}: {seconds:.4f} с, {peak_kb:.0f} КБ".format(**result))
+    if len(sys.argv) > 2:
+        regressions = compare(report, load_results(sys.argv[2]))
+        for regression in regressions:
+            print("регрессия {} n={} нагрузка {}: {} {:.4g} вместо {:.4g} (x{:.2f})".format(*regression))
+        sys.exit(1 if regressions else 0)
@@ -1,155 +1,204 @@
-from help_functions import indexes
-from random import uniform
-from numpy.random import choice
+from random import Random
+from adjacency import SparseAdjacency
+import numpy as np
+
+# смещения ячейки и ее соседей, начиная с самой ячейки
+NEAR_CELLS = ((0, 0), (-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
 
 
 def grid_generator(num):
     """
-    Генерирует матрицу смежности для графа в виде решетки
+    Генерирует граф в виде решетки, БС находится в центре решетки
     :param num: длина стороны решетки, должна быть нечетная
-    :return: adjacency_matrix
-    """
-    # Генерируем матрицу-модель решетки
-    matrix = [[j * num + i for i in range(1, num + 1)] for j in range(0, num)]
-    j = (num // 2)
-    null, matrix[j][j] = matrix[j][j], 0
-    for idx, i in enumerate(matrix):
-        for jdx, js in enumerate(matrix[idx]):
-            if matrix[idx][jdx] == null or matrix[idx][jdx] > null:
-                matrix[idx][jdx] = matrix[idx][jdx] - 1
-
-    adj_m = [[0 for i in range(num ** 2)] for j in range(num ** 2)]
-
-    # определяем соседей каждого элемента в матрице-модели, также
-    # заполняем матрицу смежности в соответствии с моделью решетки и соседями
-    for i in range(num):
-        for j in range(num):
-            neighbors = []
-            if i - 1 < 0:
-                neighbors.append(matrix[i + 1][j])
-            elif i + 1 >= num:
-                neighbors.append(matrix[i - 1][j])
-            else:
-                neighbors.append(matrix[i + 1][j])
-                neighbors.append(matrix[i - 1][j])
-
-            if j - 1 < 0:
-                neighbors.append(matrix[i][j + 1])
-            elif j + 1 >= num:
-                neighbors.append(matrix[i][j - 1])
-            else:
-                neighbors.append(matrix[i][j - 1])
-                neighbors.append(matrix[i][j + 1])
-
-            for index in neighbors:
-                adj_m[matrix[i][j]][index] = 1
-                adj_m[index][matrix[i][j]] = 1
-    return adj_m
-
-
-def tree_generator(n):
-    """Генерирует сенсорное дерево на основе количества сеноров"""
-
-    def prob_recalc(tree):
-        """Перерасчитывает вероятность с кем будет связан новый сенсор"""
-        edges_from_node = []
-        for sensor in tree:
-            edges_from_node.append(adjacency_matrix[sensor].count(1) - 1)
-        edges_num = sum(edges_from_node) / 2
-        prb = [edges_num / elem for elem in edges_from_node]
-        prb = [prob / edges_num for prob in prb]
-        sum_prb = sum(prb)
-        prb = [prob / sum_prb for prob in prb]
-        return prb
-
-    sensors_tree = [0, ]  # инициализируем дерево
-    # инициализируем матрицу смежности с 1 по главной диоганали
-    adjacency_matrix = [[0 if i != j else 1 for i in range(n + 1)]
-                        for j in range(n + 1)]
-    prob_for_sensors = [1 if i == 0 else 0 for i in sensors_tree]
-    for i in range(1, n+1):
-        # выбираем сенсор для соединения и вносим информацию о связи в матрицу смежности
-        index_for_concat = choice(sensors_tree, p=prob_for_sensors)
-        adjacency_matrix[index_for_concat][i] = 1
-        adjacency_matrix[i][index_for_concat] = 1
-        sensors_tree.append(i)
-        # перерасчитываем вероятности с учетом добавленного сенсора в сеть
-        prob_for_sensors = prob_recalc(sensors_tree)
-    return adjacency_matrix
-
-
-def graph_generator(n):
-    """
-    Generates sensor network
-    :param n - number of sensors without base station
+    :return: SparseAdjacency
     """
-    def in_circle(x0, y0, x, y, r):
-        """
-        Checks that the point with coordinates
-         (x,y) is in the circle
-        :param x0: x coordinate of center of radius
-        :param y0: y coordinate of center of radius
-        :param x: x coordinate of consider point
-        :param y: y coordinate of consider point
-        :param r: radius of circle
-        :return: True if point in radius, else False
-        """
-        return ((x - x0) ** 2 + (y - y0) ** 2) <= (r ** 2)
+    # номера узлов решетки по строкам: центральный узел получает номер 0,
+    # узлы до него сдвигаются на 1 вперед
+    positions = np.arange(num ** 2).reshape(num, num)
+    center = (num // 2) * num + num // 2
+    labels = np.where(positions < center, positions + 1, positions)
+    labels[num // 2, num // 2] = 0
 
-    def bfs(start_node, goal_node, adj_matrix):
-        """
-        Breadth first search
-        :param start_node:
-        :param goal_node:
-        :param adj_matrix: adjacency matrix
-        :return: True if start node has path with goal node, else False
-        """
-        queue = []
-        visited = [False for _ in range(len(adj_matrix))]
-        visited[start_node] = True
-        queue.append(start_node)
-        while queue:
-            node = queue.pop()
-            if node == goal_node:
-                return True
-
-            for child in indexes(adj_matrix[node], 1):
-                if visited[child] is False:
-                    queue.append(child)
-                    visited[child] = True
-        return False
-
-    # инициализируем матрицу смежности с 1 по главной диоганали
-    adjacency_matrix = [[0 if k != j else 1 for k in range(n + 1)]
-                        for j in range(n + 1)]
-
-    # определяем координаты сенсоров и радиус их действия
-    senosrs_coords = [(0.5, 0.5)] + [(uniform(0, 1), uniform(0, 1)) for _ in range(n)]
-    radius = 1/(n-1)
+    edges = np.concatenate((
+        np.column_stack((labels[:, :-1].ravel(), labels[:, 1:].ravel())),
+        np.column_stack((labels[:-1, :].ravel(), labels[1:, :].ravel())),
+    ))
+    return SparseAdjacency.from_edges(num ** 2, edges)
 
-    for i in range(len(adjacency_matrix)):
 
-        while True:
-
-            x0, y0 = senosrs_coords[i]
-            sens_in_circle = [j for j, (x, y) in enumerate(senosrs_coords)
-                              if in_circle(x0, y0, x, y, radius) and (x, y) != (x0, y0)]
+def tree_parents(n, seed=None):
+    """
+    Generates sensor tree as array of parents: a new sensor is linked with
+    a sensor of the tree with probability inversely proportional to its degree.
+
+    The sensor for linking is drawn by rejection: a sensor of the tree is chosen
+    uniformly and accepted with probability 1/degree. Degrees are kept up to date
+    after each insertion, and since the mean of 1/degree in a tree is at least
+    about 1/2, each insertion takes O(1) draws on average.
+    :param n: number of sensors without base station
+    :param seed: seed of the random generator
+    :return: array of parents, parent of the base station is -1
+    """
+    rnd = Random(seed)
+    parents = [-1] * (n + 1)
+    degrees = [0] * (n + 1)
+    for i in range(1, n + 1):
+        # первый сенсор всегда соединяется с БС
+        parent = 0
+        if i > 1:
+            while True:
+                parent = int(rnd.random() * i)
+                if rnd.random() * degrees[parent] < 1:
+                    break
+        parents[i] = parent
+        degrees[parent] += 1
+        degrees[i] = 1
+    return np.array(parents)
+
+
+def tree_generator(n, seed=None):
+    """
+    Генерирует сенсорное дерево на основе количества сеноров
+    :param n: number of sensors without base station
+    :param seed: seed of the random generator
+    :return: SparseAdjacency
+    """
+    parents = tree_parents(n, seed)
+    edges = np.column_stack((np.arange(1, n + 1), parents[1:]))
+    return SparseAdjacency.from_edges(n + 1, edges)
 
-            for j in sens_in_circle:
-                adjacency_matrix[j][i] = 1
-                adjacency_matrix[i][j] = 1
 
-            path_to_bs = bfs(i, 0, adjacency_matrix)
-            # если у сенсора нет пути до бс
-            if i != 0 and not path_to_bs:
-                senosrs_coords[i] = (uniform(0, 1), uniform(0, 1))
-                for j in sens_in_circle:
-                    adjacency_matrix[j][i] = 0
-                    adjacency_matrix[i][j] = 0
-            else:
-                break
+def random_network(n, radius=None, seed=None):
+    """
+    Generates coordinates and links of a connected random sensor network
+    in the unit square.
+
+    Sensors are placed one by one, as in the original rejection scheme: a sensor
+    is thrown again while there is no sensor connected with the base station
+    in its radius. Sensors are kept in a grid of cells with the side equal to
+    the radius, so only 9 cells are looked through for each check, and a thrown
+    again sensor is drawn uniformly from the area covered by the base station
+    component instead of being thrown at the whole square until it hits it.
+    Links are all pairs of sensors in the radius of each other; they are found
+    with one vectorized pass over the grid after all sensors are placed.
+    :param n: number of sensors without base station
+    :param radius: radius of sensor action, 1/(n-1) by default
+    :param seed: seed of the random generator
+    :return: array of coordinates (n+1)x2 and array of edges mx2, i < j
+    """
+    rnd = Random(seed)
+    if radius is None:
+        radius = 1 / (n - 1)
+    r_sq = radius ** 2
+
+    # определяем координаты сенсоров, БС находится в центре квадрата
+    coords = [(0.5, 0.5)] + [(rnd.uniform(0, 1), rnd.uniform(0, 1)) for _ in range(n)]
+
+    # сетка ячеек со стороной равной радиусу: сенсоры, связанные и не связанные с БС
+    free_cells, bs_cells = {}, {}
+    for i, (x, y) in enumerate(coords):
+        free_cells.setdefault((int(x / radius), int(y / radius)), []).append(i)
+    in_bs = [False] * (n + 1)
+    # ячейки, которые пересекаются с кругами сенсоров компоненты БС
+    near_bs, near_bs_set = [], set()
+
+    def covered(x0, y0):
+        """Checks that some sensor connected with the base station is in the radius of point (x0, y0)"""
+        cx, cy = int(x0 / radius), int(y0 / radius)
+        for dx, dy in NEAR_CELLS:
+            for x, y in bs_cells.get((cx + dx, cy + dy), ()):
+                if (x - x0) * (x - x0) + (y - y0) * (y - y0) <= r_sq:
+                    return True
+        return False
 
-    return adjacency_matrix
+    def join(i):
+        """Moves the sensor to the base station component"""
+        x, y = coords[i]
+        cx, cy = int(x / radius), int(y / radius)
+        in_bs[i] = True
+        free_cells[(cx, cy)].remove(i)
+        bs_cells.setdefault((cx, cy), []).append((x, y))
+        for dx, dy in NEAR_CELLS:
+            if (cx + dx, cy + dy) not in near_bs_set:
+                near_bs_set.add((cx + dx, cy + dy))
+                near_bs.append((cx + dx, cy + dy))
+
+    def throw_near_bs():
+        """
+        Draws a point uniformly in the part of the unit square, which is covered
+        by the base station component: a point is drawn in a random cell near
+        the component and accepted if it is covered
+        """
+        while True:
+            cx, cy = near_bs[int(rnd.random() * len(near_bs))]
+            x, y = (cx + rnd.random()) * radius, (cy + rnd.random()) * radius
+            if 0 <= x <= 1 and 0 <= y <= 1 and covered(x, y):
+                return x, y
+
+    for i in range(n + 1):
+        x0, y0 = coords[i]
+        # если у сенсора нет пути до бс, перебрасываем его
+        if i != 0 and not in_bs[i] and not covered(x0, y0):
+            free_cells[(int(x0 / radius), int(y0 / radius))].remove(i)
+            x0, y0 = coords[i] = throw_near_bs()
+            free_cells.setdefault((int(x0 / radius), int(y0 / radius)), []).append(i)
+
+        # сенсор и все еще не связанные сенсоры в его радиусе входят в компоненту БС
+        if not in_bs[i]:
+            join(i)
+        cx, cy = int(x0 / radius), int(y0 / radius)
+        for dx, dy in NEAR_CELLS:
+            for j in free_cells.get((cx + dx, cy + dy), ())[:]:
+                x, y = coords[j]
+                if (x - x0) * (x - x0) + (y - y0) * (y - y0) <= r_sq:
+                    join(j)
+
+    coords = np.array(coords)
+    return coords, _pairs_in_radius(coords, radius)
+
+
+def _pairs_in_radius(coords, radius):
+    """
+    Finds all pairs of points which are in the radius of each other
+    :param coords: array of coordinates nx2
+    :param radius: radius
+    :return: array of pairs mx2, i < j, sorted
+    """
+    side = int(1 / radius) + 3
+    cell_x = (coords[:, 0] / radius).astype(np.int64) + 1
+    cell_y = (coords[:, 1] / radius).astype(np.int64) + 1
+    keys = cell_x * side + cell_y
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    pairs = []
+    # соседние ячейки просматриваются в одну сторону, чтобы каждая пара нашлась один раз
+    for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        lo = np.searchsorted(sorted_keys, sorted_keys + dx * side + dy, side='left')
+        hi = np.searchsorted(sorted_keys, sorted_keys + dx * side + dy, side='right')
+        if dx == dy == 0:
+            lo = np.arange(len(order)) + 1
+        counts = np.maximum(hi - lo, 0)
+        first = np.repeat(np.arange(len(order)), counts)
+        second = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        first, second = order[first], order[second]
+        dist = ((coords[first] - coords[second]) ** 2).sum(axis=1)
+        mask = dist <= radius ** 2
+        pairs.append(np.sort(np.column_stack((first[mask], second[mask])), axis=1))
+
+    pairs = np.concatenate(pairs)
+    return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+
+def graph_generator(n, seed=None):
+    """
+    Generates sensor network
+    :param n - number of sensors without base station
+    :param seed - seed of the random generator
+    :return: SparseAdjacency with coordinates of sensors
+    """
+    coords, edges = random_network(n, seed=seed)
+    return SparseAdjacency.from_edges(n + 1, edges, coords)
 
 
 if __name__ == '__main__':
@@ -161,12 +210,11 @@ if __name__ == '__main__':
             print('Вы ввели некоректное число, попробуйте снова!')
 
     adj = graph_generator(N)
-    for l in adj:
+    for l in adj.to_dense():
         print(l)
 
     import networkx as nx
     import matplotlib.pyplot as plt
-    import numpy as np
-    g1 = nx.from_numpy_matrix(np.matrix(adj))
+    g1 = adj.to_networkx()
     nx.draw(g1, with_labels=True)
     plt.show()
@@ -1,6 +1,18 @@
 from graph_gen import graph_generator, tree_generator, grid_generator
 
-def interactive_console():
+
+def read_seed():
+    """Спрашивает seed сети, пустая строка - новая сеть"""
+    seed = input('Введите seed сети (пустая строка - новая сеть): ').strip()
+    return int(seed) if seed else None
+
+
+def interactive_console(store=None):
+    """
+    Спрашивает способ генерации и размер сети
+    :param store: TopologyStore, из которого сети загружаются и в который сохраняются новые сети
+    :return: матрица смежности или SparseAdjacency
+    """
     while True:
         try:
             method = int(input('''Выберите метод генерации
@@ -12,14 +24,22 @@ def interactive_console():
             if method in [1, 2, 3, 4]:
                 if method == 1:
                     N = int(input('Введите число сенсоров в сети: '))
-                    adjacency_matrix = tree_generator(N)
+                    if store is not None:
+                        adjacency_matrix, _ = store.get('tree', seed=read_seed(), n=N)
+                    else:
+                        adjacency_matrix = tree_generator(N)
                 elif method == 3:
                     N = int(input('Введите число сенсоров в сети: '))
-                    adjacency_matrix = graph_generator(N)
+                    if store is not None:
+                        adjacency_matrix, _ = store.get('graph', seed=read_seed(), n=N)
+                    else:
+                        adjacency_matrix = graph_generator(N)
                 elif method == 2:
                     N = int(input('Введите длину стороны решетки: '))
                     if N % 2 == 0:
                         raise ValueError
+                    elif store is not None:
+                        adjacency_matrix, _ = store.get('grid', num=N)
                     else:
                         adjacency_matrix = grid_generator(N)
                 elif method == 4:
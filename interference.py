@@ -0,0 +1,89 @@
+class SlotLocks(object):
+    """
+    Блокировки передатчиков и приемников внутри слота.
+
+    Вместо флагов для каждого сенсора хранится номер слота, в котором он был
+    заблокирован: сенсор заблокирован, если номер совпадает с текущим слотом.
+    Поэтому переход к следующему слоту не пересоздает и не очищает массивы,
+    а блокировка передачи касается только соседей передатчика и приемника.
+    """
+
+    def __init__(self, adj):
+        """
+        :param adj: SparseAdjacency сенсорной сети
+        """
+        self.indptr = adj.indptr.tolist()
+        self.indices = adj.indices.tolist()
+        self.trans_lock = [-1] * len(adj)
+        self.receive_lock = [-1] * len(adj)
+        self.slot = 0
+
+    def next_slot(self):
+        """Снимает все блокировки, переходя к следующему слоту"""
+        self.slot += 1
+
+    def allowed(self, source, receive):
+        """Проверяет, что передача source -> receive не конфликтует с передачами слота"""
+        return self.trans_lock[source] != self.slot and self.receive_lock[receive] != self.slot
+
+    def lock(self, source, receive):
+        """
+        Блокирует на прием соседей передатчика и на передачу соседей приемника
+        :param source: передатчик
+        :param receive: приемник
+        """
+        slot, indices = self.slot, self.indices
+        for j in indices[self.indptr[source]:self.indptr[source + 1]]:
+            self.receive_lock[j] = slot
+        self.receive_lock[source] = slot
+        for j in indices[self.indptr[receive]:self.indptr[receive + 1]]:
+            self.trans_lock[j] = slot
+        self.trans_lock[receive] = slot
+        self.trans_lock[source] = slot
+
+
+class LinkConflicts(object):
+    """
+    Граф конфликтов передач по заданным направленным связям.
+
+    Передачи s -> r и s' -> r' конфликтуют, если s' - сосед r, сам r или s,
+    или r' - сосед s или сам s (то же правило, что у SlotLocks; оно симметрично).
+    Для каждой связи заранее хранится список конфликтующих связей, поэтому
+    блокировка в слоте - это отметка номера слота у конфликтующих связей.
+    """
+
+    def __init__(self, adj, links):
+        """
+        :param adj: SparseAdjacency сенсорной сети
+        :param links: список связей (передатчик, приемник)
+        """
+        indptr, indices = adj.indptr.tolist(), adj.indices.tolist()
+        by_source, by_receive = {}, {}
+        for link, (source, receive) in enumerate(links):
+            by_source.setdefault(source, []).append(link)
+            by_receive.setdefault(receive, []).append(link)
+
+        self.conflicts = []
+        for source, receive in links:
+            conflicts = []
+            for j in indices[indptr[receive]:indptr[receive + 1]] + [receive, source]:
+                conflicts.extend(by_source.get(j, ()))
+            for j in indices[indptr[source]:indptr[source + 1]] + [source]:
+                conflicts.extend(by_receive.get(j, ()))
+            self.conflicts.append(conflicts)
+        self.locked = [-1] * len(links)
+        self.slot = 0
+
+    def next_slot(self):
+        """Снимает все блокировки, переходя к следующему слоту"""
+        self.slot += 1
+
+    def allowed(self, link):
+        """Проверяет, что передача по связи не конфликтует с передачами слота"""
+        return self.locked[link] != self.slot
+
+    def lock(self, link):
+        """Блокирует связи, конфликтующие с передачей по связи link"""
+        slot, locked = self.slot, self.locked
+        for other in self.conflicts[link]:
+            locked[other] = slot
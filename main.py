@@ -1,59 +1,50 @@
 import numpy as np
 import networkx as nx
-
-
-def sens_sort(graph):
-    return sorted(graph, key=lambda x: nx.dijkstra_path_length(graph, x, 0,))
-
-
-def route_structure(routes_list):
-    for i, sens_route in enumerate(routes_list):
-        if len(sens_route):
-            for j, msg in enumerate(sens_route):
-                routes_list[i][j] = [msg, (i,)]
-
-
-def routes_create(graph, sens_buf=list(), balance = False):
+from adjacency import as_adjacency
+from interference import LinkConflicts, SlotLocks
+from pipeline import link_pattern, period_lower_bound, steady_offsets
+from repair import IncrementalSchedule
+from routing import RoutingGraph, balanced_routes, shortest_routes
+from schedule import Schedule
+from simulation import (ArrivalEvents, ArrivalStream, BatchMeans, DivergenceDetector, ReplicaResult,
+                        compile_frame, confidence_interval, frame_step, frame_step_events)
+from stats import StatsCollector
+
+
+def routes_create(graph, sens_buf=list(), balance=False, batch=None):
     """
-    Создает структуру данных для путей вида: [сенсор_i:[сообщение_j:[путь до бс:[], источник сообщения:(i,)]]]
+    Создает маршруты сообщений всех сенсоров до БС в виде указателей на следующий шаг (см. routing.Routes)
     если параметр balance = True, то
     пытается найти наилучший путь для каждого сообщения в сенсорной сети изменяя веса ребер
-    :param graph: граф сенсорной сети построенный с помощью networkx
-    :return: список передач для каждого сенсора
+    :param graph: RoutingGraph (его веса изменяются при балансировке), SparseAdjacency или матрица смежности
+    :param batch: количество сообщений, для которых строится одно дерево кратчайших путей при балансировке;
+                  при batch=1 путь каждого сообщения ищется отдельно, как в исходном алгоритме
+    :return: Routes
     """
+    if not isinstance(graph, RoutingGraph):
+        graph = RoutingGraph(graph)
     sens_num = len(graph)
     if not sens_buf:
         sens_buf = [0 if i == 0 else 1 for i in range(sens_num)]
 
     if balance:
-        routes_p_node = np.zeros((sens_num,), dtype=np.int)
-        routes = [[] for _ in range(sens_num)]
-        for i in sens_sort(graph):
-            if i is not 0 or sens_buf[i]:
-                for msg in range(sens_buf[i]):
-                    routes[i].append(nx.dijkstra_path(graph, 0, i))
-
-                    routes_p_node[routes[i][msg]] += 1
-                    routes_p_node[0] = 0
-                    for j in routes[i][msg]:
-                        for e_num in graph[j]:
-                            graph[j][e_num]['weight'] += routes_p_node[j] * sens_num ** -2
-                            graph[e_num][j]['weight'] += routes_p_node[j] * sens_num ** -2
-    else:
-        routes = [[nx.dijkstra_path(graph, 0, i)] for i in graph]
+        return balanced_routes(graph, sens_buf, batch)
+    return shortest_routes(graph, sens_buf)
 
-    route_structure(routes)
 
-    return routes
-
-
-def rasp_create(adj_matrix, sens_buf=list(), balance=False):
+def rasp_create(adj_matrix, sens_buf=list(), balance=False, batch=None, log=None, graph=None, method='greedy'):
     """
     Функция для составления расписания передачи сообщений от передатчиков к Базовой Станции (БС) в случайно
     связанной сети.
 
-    :adj_matrix: Матрица смежности. лист листов с описанием связей графового представления системы.
+    :adj_matrix: SparseAdjacency или матрица смежности (лист листов) с описанием связей графового представления системы.
     :balance: Бинарная опция включения/отключения балансировки
+    :batch: Размер группы сообщений с общим деревом маршрутов при балансировке (см. routes_create)
+    :log: Список, в который записываются все передачи (слот, передатчик, приемник, сообщение)
+    :graph: RoutingGraph сети, после построения в нем остаются веса балансировки
+    :method: Способ заполнения слота: 'greedy' - сенсоры по порядку удаления от БС,
+             'mis' - независимое множество в графе конфликтов связей маршрутов (LinkConflicts),
+             сенсоры с наибольшей очередью первыми
     :return: длину расписания, максимальное количество сообщений которые могут уйти из фрейма
     """
 
@@ -62,126 +53,370 @@ def rasp_create(adj_matrix, sens_buf=list(), balance=False):
     frame = []
     # num_req_to_exit = [0] * len(adj_matrix)
     # frame_len = 0
-    sens_num = len(adj_matrix)  # Число передатчиков
+    adj = as_adjacency(adj_matrix)
+    sens_num = len(adj)  # Число передатчиков
     if not sens_buf:
         sens_buf = [0 if i == 0 else 1 for i in range(sens_num)]  # Количество сообщений на БС
-    graph = nx.from_numpy_matrix(np.matrix(adj_matrix))
-
-    trans_routes = routes_create(graph, sens_buf, balance)
+    if graph is None:
+        graph = RoutingGraph(adj)
+
+    routes = routes_create(graph, sens_buf, balance, batch)
+    hop_node, hop_next, origin = routes.hop_node, routes.hop_next, routes.origin
+    # порядок обхода сенсоров не меняется между слотами, т.к. веса ребер уже не меняются
+    order = graph.sens_order()[1:]
+
+    # FIFO-очереди сообщений всех сенсоров в общих массивах: первое и последнее сообщение
+    # в очереди каждого сенсора и следующее сообщение в очереди для каждого сообщения
+    head, tail, next_msg = [-1] * sens_num, [-1] * sens_num, [-1] * len(routes)
+    position = list(routes.start)  # текущая запись маршрута каждого сообщения
+
+    def push(sensor, msg):
+        next_msg[msg] = -1
+        if tail[sensor] < 0:
+            head[sensor] = msg
+        else:
+            next_msg[tail[sensor]] = msg
+        tail[sensor] = msg
+
+    for msg, sensor in enumerate(origin):
+        push(sensor, msg)
+
+    if method == 'greedy':
+        locks = SlotLocks(adj)
+    elif method == 'mis':
+        # связь каждой записи маршрута, записи с одной связью имеют один номер
+        link_ids, entry_link = {}, [-1] * len(hop_node)
+        for entry in range(1, len(hop_node)):
+            link = (hop_node[entry], hop_node[hop_next[entry]])
+            entry_link[entry] = link_ids.setdefault(link, len(link_ids))
+        locks = LinkConflicts(adj, list(link_ids))
+    else:
+        raise ValueError("Unknown scheduling method '{}'".format(method))
+    pending = sum(sens_buf[1:])  # Количество сообщений, которые еще не дошли до БС
 
-    while any(sens_buf[1:]):  # Пока все заявки не попадут на БС,...
+    while pending:  # Пока все заявки не попадут на БС,...
         # Список передач за слот
-        trans_lock = [False] * sens_num  # Список заблокированных для передачи передатчиков
-        receive_lock = [False] * sens_num  # Список заблокированных для приёма  передатчиков
+        locks.next_slot()
         frame.append([])
         # В цикле исключена возможность передачи сообщения из БС (т.к. начинаем с 1)
         # Проходимся по сенсорам, проверяем возможность передачи и передаём
-        for i in sens_sort(graph)[1:]:
-            # берем сообщение из i-го сенсора, если есть
-            if trans_routes[i]:
-                message_route = trans_routes[i][0]
-            else:
+        if method == 'greedy':
+            candidates = order
+        else:
+            # передатчики с большей очередью первыми, при равных - по удалению от БС
+            candidates = sorted((s for s in order if head[s] >= 0), key=lambda s: -sens_buf[s])
+        for source in candidates:
+            # берем сообщение из очереди сенсора, если есть
+            msg = head[source]
+            if msg < 0 or sens_buf[source] <= 0:
                 continue
+            entry = hop_next[position[msg]]
+            receive = hop_node[entry]  # куда передавать
+
             # Проверка возможности передачи сообщения
-            if len(message_route) > 1 and sens_buf[i] > 0:
-                source = message_route[0][-1]  # откуда передавать
-                receive = message_route[0][-2]  # куда передавать
-
-                # Проверка возможности передачи сообщения
-                trans_allowed = True
-                if trans_lock[source] or receive_lock[receive]:
-                    trans_allowed = False
-                if trans_allowed:
-                    # Добавление новой передачи в слот
-                    # Блокировка на передачу и прием ближайших передатчиков
-                    receive_lock = [True if neighbor == 1 or j == source
-                                    else receive_lock[j]
-                                    for j, neighbor in enumerate(adj_matrix[source])]
-
-                    trans_lock = [True if neighbor == 1 or j == receive
-                                  else trans_lock[j]
-                                  for j, neighbor in enumerate(adj_matrix[receive])]
-
-                    trans_lock[receive] = True
-                    trans_lock[source] = True
-                    sens_buf[receive] += 1
-                    sens_buf[source] -= 1
-
-                    message_route[0].pop()
-                    if len(message_route[0]) == 1:
-                        # num_req_to_exit[message_route[1][0]] += 1
-                        frame[-1].append(message_route[1][0])
-                    route = trans_routes[source].pop(trans_routes[source].index(message_route))
-                    trans_routes[receive].append(route)
+            # Блокировка на передачу и прием ближайших передатчиков
+            if method == 'greedy' and locks.allowed(source, receive):
+                locks.lock(source, receive)
+            elif method == 'mis' and locks.allowed(entry_link[position[msg]]):
+                locks.lock(entry_link[position[msg]])
+            else:
+                continue
+
+            # Добавление новой передачи в слот
+            sens_buf[receive] += 1
+            sens_buf[source] -= 1
+
+            head[source] = next_msg[msg]
+            if head[source] < 0:
+                tail[source] = -1
+            position[msg] = entry
+            if log is not None:
+                log.append((len(frame) - 1, source, receive, msg))
+            if receive == 0:
+                frame[-1].append(origin[msg])
+                pending -= 1
+            else:
+                push(receive, msg)
 
         # frame_len += 1
     return frame  # , num_req_to_exit   #result_way
 
 
-def sens_graph_with_prob(adj, prb=None, num_of_frames=1000, adaptation=0):
+def compare_methods(adj_matrix, sens_buf=list(), balance=True, methods=('greedy', 'mis')):
+    """
+    Сравнивает длину фрейма разных способов заполнения слотов (см. rasp_create) на одной топологии
+
+    :adj_matrix: SparseAdjacency или матрица смежности
+    :sens_buf: Количество сообщений в каждом сенсоре
+    :balance: Балансировка маршрутов
+    :methods: Способы, первый из них - базовый
+    :return: словарь способ -> (длина фрейма, сокращение длины относительно базового способа в долях)
+    """
+    adj = as_adjacency(adj_matrix)
+    lengths = {method: len(rasp_create(adj, sens_buf=list(sens_buf), balance=balance, method=method))
+               for method in methods}
+    base = lengths[methods[0]]
+    return {method: (length, (base - length) / base if base else 0.0) for method, length in lengths.items()}
+
+
+def rasp_schedule(adj_matrix, sens_buf=list(), balance=True, batch=None, method='greedy'):
+    """
+    Составляет расписание rasp_create со всеми передачами в компактном виде
+
+    :adj_matrix: SparseAdjacency или матрица смежности
+    :sens_buf: Количество сообщений в каждом сенсоре
+    :balance: Балансировка маршрутов
+    :batch: Размер группы сообщений с общим деревом маршрутов при балансировке (см. routes_create)
+    :method: Способ заполнения слотов (см. rasp_create)
+    :return: Schedule, фрейм дает метод frame()
+    """
+    log = []
+    frame = rasp_create(adj_matrix, sens_buf=list(sens_buf), balance=balance, batch=batch, log=log, method=method)
+    return Schedule.from_log(log, len(frame))
+
+
+def rasp_pipeline(adj_matrix, sens_buf=list(), balance=True, batch=None):
+    """
+    Составляет конвейерное расписание: фреймы повторяются с периодом, меньшим длины фрейма,
+    и передачи соседних фреймов перекрываются без конфликтов (см. pipeline.link_pattern)
+
+    :adj_matrix: SparseAdjacency или матрица смежности
+    :sens_buf: Количество сообщений в каждом сенсоре
+    :balance: Балансировка маршрутов
+    :batch: Размер группы сообщений с общим деревом маршрутов при балансировке (см. routes_create)
+    :return: фрейм с моментами доставки сообщений от начала фрейма в установившемся режиме
+             (его длина может быть больше периода) и период; если цикл не короче фрейма
+             rasp_create, возвращается этот фрейм и его длина
+    """
+    adj = as_adjacency(adj_matrix)
+    if not sens_buf:
+        sens_buf = [0 if i == 0 else 1 for i in range(len(adj))]
+    graph, log = RoutingGraph(adj), []
+    frame = rasp_create(adj, sens_buf=list(sens_buf), balance=balance, batch=batch, log=log, graph=graph)
+
+    # маршруты сообщений - из передач фрейма, чтобы не строить их второй раз
+    paths = [[] for _ in range(sum(sens_buf[1:]))]
+    for _, source, _, msg in log:
+        paths[msg].append(source)
+    for path in paths:
+        path.append(0)
+    # цикл не бывает короче нижней границы, и тогда он не короче фрейма
+    if period_lower_bound(paths) >= len(frame):
+        return frame, len(frame)
+    pattern = link_pattern(adj, paths, graph.sens_order())
+    offsets = steady_offsets(pattern, paths) if len(pattern) < len(frame) else None
+    if offsets is None:
+        return frame, len(frame)
+
+    pipelined = [[] for _ in range(max(offsets) + 1)]
+    for msg, offset in enumerate(offsets):
+        pipelined[offset].append(paths[msg][0])
+    return pipelined, len(pattern)
+
+
+def rasp_incremental(adj_matrix, sens_buf=list(), batch=None):
+    """
+    Составляет расписание с балансировкой, которое затем можно исправлять при изменении
+    количества сообщений в сенсорах или топологии сети (отказ, появление и перемещение сенсоров)
+    вместо построения заново
+
+    :adj_matrix: SparseAdjacency или матрица смежности
+    :sens_buf: Количество сообщений в каждом сенсоре
+    :batch: Размер группы сообщений с общим деревом маршрутов при балансировке (см. routes_create)
+    :return: IncrementalSchedule, фрейм дает метод frame(), исправление - метод update(sens_buf)
+    """
+    adj = as_adjacency(adj_matrix)
+    if not sens_buf:
+        sens_buf = [0 if i == 0 else 1 for i in range(len(adj))]
+    graph, log = RoutingGraph(adj), []
+    rasp_create(adj, sens_buf=list(sens_buf), balance=True, batch=batch, log=log, graph=graph)
+    return IncrementalSchedule(adj, graph, log, sens_buf)
+
+
+def sens_graph_with_prob(adj, prb=None, num_of_frames=1000, adaptation=0, frame=None, rng=None, cache=None,
+                         repair=False, event_driven=False, rel_width=None, confidence=0.95, overflow=None,
+                         stats=False, method='greedy', pipeline=False):
     """
     Моделирует буфер сенсоров в сенорной сети
 
-    :adj: Матрица смежности сенсорной сети
+    :adj: SparseAdjacency или матрица смежности сенсорной сети
     :sch: Расписание работы сенсорной сети
     :prb: Вероятность появления сообщения в кажом слоте для всех сенсоров
     :num_of_frames: Количество фреймов для моделирования сенсорной сети
     :adaptation: Изменять ли расписание на каждом фрейме
-    :return: среднее количество сообщений в буфере каждого сенсора
+    :frame: Начальное расписание, если оно уже построено rasp_create с балансировкой, фрейм или Schedule
+    :rng: Генератор случайных чисел numpy, по умолчанию np.random
+    :cache: ScheduleCache для расписаний адаптивного режима, расписания для уже встречавшихся
+            векторов сообщений в сенсорах не строятся заново
+    :repair: Исправлять расписание при адаптации (см. rasp_incremental) вместо построения заново,
+             начальное расписание frame при этом не используется
+    :event_driven: Разыгрывать моменты появления сообщений (ArrivalEvents) вместо каждого слота
+                   и пропускать фреймы, в которых система пуста; при малой вероятности сообщений
+                   это намного быстрее, распределение результата то же
+    :rel_width: Остановить моделирование раньше num_of_frames фреймов, когда полуширина доверительного
+                интервала среднего по групповым средним (BatchMeans) не больше этой доли среднего
+    :confidence: Доверительная вероятность для rel_width
+    :overflow: Количество сообщений в системе, при значимом росте выше которого (DivergenceDetector)
+               система считается переполненной и моделирование прекращается
+    :stats: Собирать потоковую статистику буферов и времени пребывания сообщений (StatsCollector)
+    :method: Способ заполнения слотов расписания (см. rasp_create)
+    :pipeline: Повторять конвейерное расписание rasp_pipeline, только без адаптации;
+               начальное расписание frame при этом не используется
+    :return: среднее количество сообщений в буфере каждого сенсора, inf при переполнении;
+             при stats=True - SimulationStats, среднее в поле mean
     """
     assert type(prb) is float or 0 <= prb <= 1
+    adj = as_adjacency(adj)
+
+    state = None
+    if repair and adaptation > 0:
+        state = rasp_incremental(adj)
+        frame = state.frame()
+
+    # расписание для пустых буферов
+    empty = compile_frame([], len(adj))
+
+    def adapt(sens_buf):
+        if state is None and not any(sens_buf):
+            return empty
+
+        def build():
+            if state is not None:
+                state.update(sens_buf)
+                return compile_frame(state.frame(), len(adj))
+            return compile_frame(rasp_create(adj_matrix=adj, sens_buf=list(sens_buf), balance=True, method=method),
+                                 len(adj))
+        if cache is None:
+            return build()
+        # исправленные и построенные заново расписания разными способами различаются
+        return cache.get(adj, sens_buf, build, key_extra=(method, state is not None))
 
     # сообщения которые уйдут, но еще в системе
-    sensors_out = [1 if i > 0 else 0 for i in range(len(adj))]
-    sensors_in = [0 for _ in range(len(adj))]  # сообщения которые придут на слоте
-    frame = rasp_create(adj_matrix=adj, balance=True)
-    avg_buff, slot_num, frame_num, new_frame = 0, 0, 0, False
-
-    # количество пришедших сообщений в слот
-    count_come = np.random.binomial(1, prb, size=[1000000, len(adj)-1])
-
-    for total_slots, slot_income in enumerate(count_come):  # общее количество слотов, сообщения на каждый сенсор
-
-        sensors_in = [0 if i == 0 else sensors_in[i]+slot_income[i-1] for i in range(len(adj))]
-        
-        # print(frame)
-        if frame:
-            sensors_out = [sens-1 if i in frame[slot_num] and sens > 0 else sens for i, sens in enumerate(sensors_out)]
-
-        avg_buff += sum(sensors_in)+sum(sensors_out)
-        slot_num += 1
-        if slot_num >= len(frame):
-            # в конце фрейма все приходящие сообщения становятся уходящими на следующем слоте,
-            # а все приходящие обнуляются
-            sensors_out = [sensors_in[k] + sensors_out[k] for k in range(len(sensors_in))]
-            sensors_in = [0 for i, _ in enumerate(range(len(adj)))]
-            slot_num, new_frame = 0, True
-            frame_num += 1
-
-        if frame_num > num_of_frames:
-            break
-
-        if adaptation > 0 and new_frame is True:
-            if frame_num % adaptation == 0:
-                frame = rasp_create(adj_matrix=adj, sens_buf=sensors_out[:], balance=True)
-                new_frame = False
-
-    avg_buff /= total_slots
+    sensors_out = np.array([1 if i > 0 else 0 for i in range(len(adj))])
+    if pipeline:
+        if adaptation > 0:
+            raise ValueError("Pipelined schedule can not be adapted")
+        frame, period = rasp_pipeline(adj)
+        frame = compile_frame(frame, len(adj), period)
+    else:
+        if frame is None:
+            frame = rasp_create(adj_matrix=adj, balance=True, method=method)
+        frame = compile_frame(frame, len(adj))
+    avg_buff, total_slots = 0, 0
+
+    # количество пришедших сообщений в слот, генерируется блоками по мере моделирования
+    if event_driven:
+        count_come, step = ArrivalEvents(len(adj) - 1, prb, rng=rng), frame_step_events
+    else:
+        count_come, step = ArrivalStream(len(adj) - 1, prb, rng=rng), frame_step
+
+    batch_means = BatchMeans() if rel_width is not None else None
+    detector = DivergenceDetector(overflow) if overflow is not None else None
+    collector = StatsCollector(len(adj), sensors_out) if stats else None
+
+    # моделирование идет по фреймам целиком: сообщения, пришедшие во время фрейма,
+    # становятся уходящими в конце фрейма
+    frame_num, last_frame = 1, num_of_frames + 1
+    while frame_num <= last_frame:
+        if event_driven and not sensors_out.any():
+            # система пуста: фреймы до первого сообщения ничего не добавляют к сумме
+            idle = min(count_come.idle_slots() // frame[0], last_frame - frame_num + 1)
+            adapt_after = False
+            if idle > 0 and adaptation > 0 and (state is not None or frame is not empty):
+                # расписание меняется в первой адаптации, дальше фреймы пропускаются до сообщения
+                next_adapt = -(-frame_num // adaptation) * adaptation
+                if next_adapt <= min(frame_num + idle - 1, num_of_frames):
+                    idle, adapt_after = next_adapt - frame_num + 1, True
+            if idle > 0:
+                count_come.skip(idle * frame[0])
+                total_slots += idle * frame[0]
+                if batch_means is not None:
+                    batch_means.add(0, frame[0], idle)
+                if detector is not None:
+                    detector.add(0)
+                if collector is not None:
+                    collector.add_idle(frame[0], idle)
+                frame_num += idle
+                if adapt_after:
+                    frame = adapt(sensors_out.tolist())
+                continue
 
+        arrivals = count_come.take(frame[0])
+        if collector is not None:
+            collector.add_frame(sensors_out, arrivals if event_driven else np.nonzero(arrivals), frame)
+        sensors_out, frame_buff = step(sensors_out, arrivals, frame)
+        avg_buff += frame_buff
+        total_slots += frame[0]
+
+        if detector is not None:
+            detector.add(int(sensors_out.sum()))
+            if detector.diverged():
+                return collector.result(diverged=True) if collector is not None else float('inf')
+        if batch_means is not None:
+            batch_means.add(frame_buff, frame[0])
+            if batch_means.converged(rel_width, confidence):
+                break
+
+        if adaptation > 0 and frame_num % adaptation == 0 and frame_num <= num_of_frames:
+            frame = adapt(sensors_out.tolist())
+        frame_num += 1
+
+    avg_buff /= total_slots - 1
+
+    if collector is not None:
+        return collector.result()
     return avg_buff
 
 
+def sens_graph_replicas(adj, prb=None, num_of_frames=1000, replicas=10, confidence=0.95, rng=None):
+    """
+    Моделирует буфер сенсоров в нескольких независимых репликах одновременно.
+
+    Все реплики используют одну топологию и одно расписание без адаптации и
+    продвигаются вместе по фреймам, буферы хранятся в массиве реплики x сенсоры.
+
+    :adj: SparseAdjacency или матрица смежности сенсорной сети
+    :prb: Вероятность появления сообщения в кажом слоте для всех сенсоров
+    :num_of_frames: Количество фреймов для моделирования сенсорной сети
+    :replicas: Количество реплик
+    :confidence: Доверительная вероятность для интервала среднего
+    :rng: Генератор случайных чисел numpy, по умолчанию np.random
+    :return: ReplicaResult: средние каждой реплики (как у sens_graph_with_prob),
+             общее среднее и доверительный интервал по нормальному приближению
+    """
+    assert type(prb) is float or 0 <= prb <= 1
+    adj = as_adjacency(adj)
+    sens_num = len(adj)
+
+    sensors_out = np.zeros((replicas, sens_num), dtype=np.int64)
+    sensors_out[:, 1:] = 1
+    frame = compile_frame(rasp_create(adj_matrix=adj, balance=True), sens_num)
+    avg_buff, total_slots = np.zeros(replicas), 0
+
+    # реплики генерируются одним потоком, как если бы сенсоров было в replicas раз больше
+    count_come = ArrivalStream(replicas * (sens_num - 1), prb, rng=rng)
+
+    for _ in range(num_of_frames + 1):
+        arrivals = count_come.take(frame[0]).reshape(frame[0], replicas, sens_num - 1).swapaxes(0, 1)
+        sensors_out, frame_buff = frame_step(sensors_out, arrivals, frame)
+        avg_buff += frame_buff
+        total_slots += frame[0]
+
+    means = avg_buff / (total_slots - 1)
+    return ReplicaResult(means, means.mean(), confidence_interval(means, confidence))
+
+
 def show_graph(graph):
     """
     Функция для отображения графа
 
-    :graph: матрица смежности (лист листов) или объект графа из библиотеки networkX
+    :graph: SparseAdjacency, матрица смежности (лист листов) или объект графа из библиотеки networkX
     :return: None
     """
     import matplotlib.pyplot as plt
 
-    if type(graph) == list:
-        graph = nx.from_numpy_matrix(np.matrix(graph))
+    if not isinstance(graph, nx.Graph):
+        graph = as_adjacency(graph).to_networkx()
     nx.draw_networkx(graph, with_labels=True)
     plt.show()
 
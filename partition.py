@@ -0,0 +1,234 @@
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import main
+from adjacency import SparseAdjacency, as_adjacency
+
+ScalingPoint = namedtuple('ScalingPoint', [
+    'workers',
+    'regions',
+    'seconds',  # время построения разбиением
+    'length',  # длина объединенного фрейма
+    'speedup',  # ускорение относительно построения одним rasp_create
+    'overhead',  # удлинение фрейма относительно rasp_create, в долях
+])
+
+
+def partition_regions(adj, regions):
+    """
+    Разбивает сенсоры на области: поддеревья дерева обхода в ширину от БС, растущие из соседей БС.
+
+    Поддеревья объединяются в regions групп примерно равного размера (самое большое
+    поддерево - в самую малую группу). Каждая область связна вместе с БС, поэтому
+    все ее сообщения доходят до БС, не выходя из области.
+    :param adj: SparseAdjacency сенсорной сети
+    :param regions: количество областей
+    :return: список массивов сенсоров каждой области, без БС и без пустых областей
+    """
+    indptr, indices = adj.indptr.tolist(), adj.indices.tolist()
+    root = [-1] * len(adj)  # сосед БС, из которого вырос сенсор
+    root[0] = 0
+    queue = deque()
+    for j in indices[indptr[0]:indptr[1]]:
+        root[j] = j
+        queue.append(j)
+    while queue:
+        i = queue.popleft()
+        for j in indices[indptr[i]:indptr[i + 1]]:
+            if root[j] < 0:
+                root[j] = root[i]
+                queue.append(j)
+
+    subtrees = {}
+    for i in range(1, len(adj)):
+        subtrees.setdefault(root[i], []).append(i)
+    groups = [[] for _ in range(max(1, min(regions, len(subtrees))))]
+    for subtree in sorted(subtrees.values(), key=len, reverse=True):
+        min(groups, key=len).extend(subtree)
+    return [np.array(sorted(group), dtype=np.int64) for group in groups if group]
+
+
+def region_adjacency(adj, nodes):
+    """
+    Подграф области с БС
+    :param adj: SparseAdjacency сенсорной сети
+    :param nodes: сенсоры области
+    :return: SparseAdjacency подграфа, БС - сенсор 0, сенсор nodes[k] - сенсор k + 1
+    """
+    local = np.full(len(adj), -1, dtype=np.int64)
+    local[0] = 0
+    local[nodes] = np.arange(1, len(nodes) + 1)
+    edges = local[adj.edges()]
+    edges = edges[(edges >= 0).all(axis=1)]
+    return SparseAdjacency.from_edges(len(nodes) + 1, edges)
+
+
+def _schedule_region(indptr, indices, sens_buf, balance, batch):
+    """Строит расписание области в процессе-исполнителе"""
+    log = []
+    main.rasp_create(SparseAdjacency(indptr, indices), sens_buf=sens_buf, balance=balance, batch=batch, log=log)
+    return np.array(log, dtype=np.int64).reshape(-1, 4)
+
+
+class _FreeSlots(object):
+    """
+    Блокировки сенсоров во всех слотах расписания, которые только добавляются.
+
+    Для каждого сенсора заблокированный слот указывает на следующий (система непересекающихся
+    множеств со сжатием путей), поэтому ближайший свободный слот находится за почти постоянное время.
+    """
+
+    def __init__(self, sens_num):
+        self.sens_num = sens_num
+        self.next = {}  # слот * sens_num + сенсор -> слот, с которого продолжать поиск
+
+    def find(self, sensor, slot_num):
+        """Первый слот не раньше slot_num, в котором сенсор не заблокирован"""
+        nxt, n, path = self.next, self.sens_num, []
+        key = slot_num * n + sensor
+        while key in nxt:
+            path.append(key)
+            slot_num = nxt[key]
+            key = slot_num * n + sensor
+        for key in path:
+            nxt[key] = slot_num
+        return slot_num
+
+    def lock(self, sensors, slot_num):
+        """Блокирует сенсоры в слоте"""
+        base = slot_num * self.sens_num
+        self.next.update(dict.fromkeys([base + j for j in sensors], slot_num + 1))
+
+
+def merge_logs(adj, logs):
+    """
+    Объединяет расписания областей в один фрейм.
+
+    Передачи областей на границах и у БС могут конфликтовать между собой (у БС всегда:
+    она принимает одно сообщение за слот). Передачи всех областей перебираются по номеру
+    слота в своей области и вставляются в первый слот общего расписания, где передатчик
+    не заблокирован на передачу и приемник - на прием (правило interference.SlotLocks),
+    и не раньше следующего слота после предыдущей передачи того же сообщения.
+    :param adj: SparseAdjacency сенсорной сети
+    :param logs: передачи каждой области (слот, передатчик, приемник, сообщение)
+                 в номерах сенсоров всей сети и с общими номерами сообщений
+    :return: фрейм, как у rasp_create, и его передачи (слот, передатчик, приемник, сообщение)
+    """
+    merged = np.concatenate([log for log in logs if len(log)] or [np.zeros((0, 4), dtype=np.int64)])
+    merged = merged[np.argsort(merged[:, 0], kind='stable')]
+
+    indptr, indices = adj.indptr.tolist(), adj.indices.tolist()
+    closed = [indices[indptr[i]:indptr[i + 1]] + [i] for i in range(len(adj))]
+    # блокировки нужны только сенсорам, которым еще предстоит передавать (принимать)
+    sends = np.bincount(merged[:, 1], minlength=len(adj)).tolist()
+    receives = np.bincount(merged[:, 2], minlength=len(adj)).tolist()
+    trans_free, receive_free = _FreeSlots(len(adj)), _FreeSlots(len(adj))
+    last, origin, log, frame = {}, {}, [], []
+    for _, source, receive, msg in merged.tolist():
+        sends[source] -= 1
+        receives[receive] -= 1
+        origin.setdefault(msg, source)
+        # первый слот, свободный и для передатчика, и для приемника
+        slot_num = trans_free.find(source, last.get(msg, -1) + 1)
+        while True:
+            free = receive_free.find(receive, slot_num)
+            if free == slot_num:
+                break
+            slot_num = trans_free.find(source, free)
+
+        receive_free.lock([j for j in closed[source] if receives[j]], slot_num)
+        trans_free.lock([j for j in closed[receive] + [source] if sends[j]], slot_num)
+        last[msg] = slot_num
+        log.append((slot_num, source, receive, msg))
+        if receive == 0:
+            while len(frame) <= slot_num:
+                frame.append([])
+            frame[slot_num].append(origin[msg])
+    log.sort()
+    return frame, log
+
+
+def rasp_partitioned(adj_matrix, sens_buf=list(), balance=True, batch=None, regions=None, workers=None, log=None):
+    """
+    Составляет расписание большой сети по областям в пуле процессов.
+
+    Сеть разбивается на области (partition_regions), расписание каждой области строится
+    rasp_create в отдельном процессе, затем расписания объединяются (merge_logs).
+    Маршруты строятся внутри областей, поэтому балансировка не переносит нагрузку между ними.
+    :param adj_matrix: SparseAdjacency или матрица смежности
+    :param sens_buf: количество сообщений в каждом сенсоре
+    :param balance: балансировка маршрутов внутри областей
+    :param batch: размер группы сообщений с общим деревом маршрутов (см. routes_create)
+    :param regions: количество областей, по умолчанию равно количеству процессов
+    :param workers: количество процессов, по умолчанию число ядер
+    :param log: список, в который записываются все передачи объединенного фрейма, как у rasp_create
+    :return: фрейм, как у rasp_create
+    """
+    adj = as_adjacency(adj_matrix)
+    if not sens_buf:
+        sens_buf = [0 if i == 0 else 1 for i in range(len(adj))]
+    workers = workers or os.cpu_count()
+    parts = partition_regions(adj, regions or workers)
+
+    tasks = []
+    for nodes in parts:
+        sub = region_adjacency(adj, nodes)
+        tasks.append((sub.indptr, sub.indices, [0] + [int(sens_buf[i]) for i in nodes], balance, batch))
+    if workers > 1 and len(parts) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(parts))) as pool:
+            region_logs = list(pool.map(_schedule_region, *zip(*tasks)))
+    else:
+        region_logs = [_schedule_region(*task) for task in tasks]
+
+    # перевод в номера сенсоров всей сети, сообщения разных областей нумеруются подряд
+    logs, msg_offset = [], 0
+    for nodes, region_log in zip(parts, region_logs):
+        region_log = region_log.copy()
+        glob = np.concatenate(([0], nodes))
+        region_log[:, 1:3] = glob[region_log[:, 1:3]]
+        region_log[:, 3] += msg_offset
+        msg_offset += sum(int(sens_buf[i]) for i in nodes)
+        logs.append(region_log)
+
+    frame, merged_log = merge_logs(adj, logs)
+    if log is not None:
+        log.extend(merged_log)
+    return frame
+
+
+def scaling_report(adj_matrix, workers=(1, 2, 4), balance=True, batch=None, regions=None):
+    """
+    Сравнивает построение расписания по областям с одним rasp_create на всей сети
+    :param adj_matrix: SparseAdjacency или матрица смежности
+    :param workers: количества процессов
+    :param balance: балансировка маршрутов
+    :param batch: размер группы сообщений с общим деревом маршрутов
+    :param regions: количество областей, по умолчанию равно количеству процессов
+    :return: длина фрейма rasp_create, время его построения и список ScalingPoint
+    """
+    adj = as_adjacency(adj_matrix)
+    start = time.perf_counter()
+    length = len(main.rasp_create(adj, balance=balance, batch=batch))
+    seconds = time.perf_counter() - start
+
+    points = []
+    for count in workers:
+        start = time.perf_counter()
+        frame = rasp_partitioned(adj, balance=balance, batch=batch, regions=regions or count, workers=count)
+        elapsed = time.perf_counter() - start
+        points.append(ScalingPoint(count, len(partition_regions(adj, regions or count)), elapsed, len(frame),
+                                   seconds / elapsed, (len(frame) - length) / length if length else 0.0))
+    return length, seconds, points
+
+
+if __name__ == "__main__":
+    from graph_gen import graph_generator
+
+    mono_length, mono_seconds, report = scaling_report(graph_generator(5000))
+    print("rasp_create: длина {}, {:.2f} с".format(mono_length, mono_seconds))
+    for point in report:
+        print("процессов {}, областей {}: длина {} ({:+.1%}), {:.2f} с, ускорение {:.2f}".format(
+            point.workers, point.regions, point.length, point.overhead, point.seconds, point.speedup))
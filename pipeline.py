@@ -0,0 +1,112 @@
+from collections import deque
+
+from interference import SlotLocks
+
+
+def period_lower_bound(paths):
+    """
+    Нижняя граница периода: БС принимает одно сообщение за слот, а сенсор
+    не может в одном слоте и передавать, и принимать
+    :param paths: маршруты сообщений от источника до БС
+    """
+    busy = {}
+    for path in paths:
+        for node in path[:-1]:
+            busy[node] = busy.get(node, 0) + 1
+        for node in path[1:-1]:
+            busy[node] += 1
+    return max([len(paths)] + list(busy.values()))
+
+
+def link_pattern(adj, paths, order):
+    """
+    Периодическое расписание связей.
+
+    В установившемся режиме каждый цикл через связь проходит столько сообщений, сколько
+    маршрутов ее использует, а порядок передач сообщения внутри цикла не важен: сообщение
+    может ждать в сенсоре следующего цикла. Поэтому цикл строится по связям, а не по
+    сообщениям: в каждый слот жадно добавляются связи с остатком передач, пока остатки
+    не кончатся. Сначала идут связи, к передатчику которых сообщение текущего цикла уже
+    пришло, - так задержка остается близкой к задержке обычного фрейма, - затем связи
+    с наибольшим остатком, при равных - по удалению передатчика от БС.
+    :param adj: SparseAdjacency сенсорной сети
+    :param paths: маршруты сообщений от источника до БС
+    :param order: сенсоры по удалению от БС
+    :return: цикл, список слотов со связями (передатчик, приемник)
+    """
+    rank = {node: k for k, node in enumerate(order)}
+    demand = {}
+    waiting = {}  # связь -> очередь (сообщение, номер шага маршрута) текущего цикла
+    for msg, path in enumerate(paths):
+        for link in zip(path, path[1:]):
+            demand[link] = demand.get(link, 0) + 1
+        waiting.setdefault((path[0], path[1]), deque()).append((msg, 0))
+
+    locks, pattern = SlotLocks(adj), []
+    while demand:
+        locks.next_slot()
+        slot = []
+        for source, receive in sorted(demand, key=lambda link: (not waiting.get(link), -demand[link],
+                                                                rank[link[0]])):
+            if locks.allowed(source, receive):
+                locks.lock(source, receive)
+                slot.append((source, receive))
+        moved = []
+        for link in slot:
+            demand[link] -= 1
+            if not demand[link]:
+                del demand[link]
+            if waiting.get(link):
+                moved.append(waiting[link].popleft())
+        # принятые в слоте сообщения передаются дальше не раньше следующего слота
+        for msg, step in moved:
+            path = paths[msg]
+            if step + 2 < len(path):
+                waiting.setdefault((path[step + 1], path[step + 2]), deque()).append((msg, step + 1))
+        pattern.append(slot)
+    return pattern
+
+
+def steady_offsets(pattern, paths, max_cycles=64):
+    """
+    Моменты доставки сообщений в установившемся режиме повторения цикла.
+
+    В начале каждого цикла все сообщения появляются в своих источниках и ждут
+    в очередях связей (FIFO). Циклы повторяются, пока моменты доставки сообщений
+    цикла от его начала не перестанут меняться.
+    :param pattern: цикл от link_pattern
+    :param paths: маршруты сообщений от источника до БС
+    :param max_cycles: наибольшее количество моделируемых циклов
+    :return: момент доставки каждого сообщения от начала цикла, может быть больше периода;
+             если за max_cycles моменты не установились - моменты последнего доставленного цикла
+    """
+    period = len(pattern)
+    queues = {}  # связь -> очередь (цикл, сообщение, номер шага маршрута)
+    delivered = {}  # цикл -> моменты доставки его сообщений
+    previous = None
+    for cycle in range(max_cycles):
+        for msg, path in enumerate(paths):
+            queues.setdefault((path[0], path[1]), deque()).append((cycle, msg, 0))
+        for offset, slot in enumerate(pattern):
+            time = cycle * period + offset
+            moved = []
+            for link in slot:
+                queue = queues.get(link)
+                if queue:
+                    moved.append(queue.popleft())
+            # принятые в слоте сообщения передаются дальше не раньше следующего слота
+            for sent_cycle, msg, step in moved:
+                path = paths[msg]
+                if step + 2 == len(path):
+                    delivered.setdefault(sent_cycle, [None] * len(paths))[msg] = time - sent_cycle * period
+                else:
+                    queues.setdefault((path[step + 1], path[step + 2]), deque()).append((sent_cycle, msg, step + 1))
+        for done in sorted(delivered):
+            offsets = delivered[done]
+            if None in offsets:
+                break
+            del delivered[done]
+            if offsets == previous:
+                return offsets
+            previous = offsets
+    return previous
@@ -2,6 +2,9 @@ import main
 import numpy as np
 from help_functions import draw_plot, key_init
 from interactive_console import interactive_console
+from saturation import saturation_point
+from sweep import run_sweep
+from topology_store import TopologyStore
 
 
 def avg_messages_calc(p, len_frame, sens_count):
@@ -14,7 +17,8 @@ def avg_messages_calc(p, len_frame, sens_count):
 
 if __name__ == "__main__":
 
-    adjacency_matrix = interactive_console()
+    # сгенерированные сети сохраняются и при том же seed загружаются без генерации
+    adjacency_matrix = interactive_console(TopologyStore('topologies'))
 
     sensors_count = len(adjacency_matrix) - 1
     frame = main.rasp_create(adjacency_matrix, balance=True)
@@ -38,6 +42,8 @@ if __name__ == "__main__":
 
     buf = 0
     num_of_frames = 1000
+    seed = 2018
+    rel_width = 0.02
 
     # Теоретический расчет среднего количества сообщений в системе
     for i, prob in enumerate(prob_for_teor):
@@ -48,36 +54,35 @@ if __name__ == "__main__":
             except ZeroDivisionError:
                 mean_time_teor.append(0)
 
+    # все точки сетки независимы и моделируются параллельно, моделирование точки
+    # останавливается при достижении точности, адаптивный режим - и при переполнении
+    sweep_results = run_sweep(adjacency_matrix, probabilities, [0],
+                              num_of_frames=num_of_frames, seed=seed,
+                              event_driven=True, rel_width=rel_width, stats=True)
+    sweep_results.update(run_sweep(adjacency_matrix, probabilities, adaptation_frames,
+                                   num_of_frames=num_of_frames, seed=seed + 1, skip_above=200,
+                                   event_driven=True, rel_width=rel_width, overflow=200, stats=True))
+
     for i, prob in enumerate(probabilities):
 
         # стандартный режим алгоритма
-        buffer_mean.append(main.sens_graph_with_prob(adjacency_matrix, prb=prob, num_of_frames=num_of_frames))
-        print(prob)
+        buffer_mean.append(sweep_results[prob, 0].mean)
+        # время пребывания измеряется при моделировании, а не делением по формуле Литтла
+        mean_time.append(sweep_results[prob, 0].sojourn_mean)
 
         # адаптивный режим алгоритма
         for j, adapt_frame in enumerate(adaptation_frames):
             key_init(buff_adapt, adapt_frame, [])
             key_init(mean_time_adapt, adapt_frame, [])
             if adapt_frame not in adaptation_skip:
-                mean_reqests_adapt = main.sens_graph_with_prob(adjacency_matrix,
-                                                               prb=prob,
-                                                               num_of_frames=num_of_frames,
-                                                               adaptation=adapt_frame)
+                adapt_stats = sweep_results[prob, adapt_frame]
+                mean_reqests_adapt = adapt_stats.mean
 
                 if mean_reqests_adapt > 200:
                     adaptation_skip.append(adapt_frame)
                 else:
                     buff_adapt[adapt_frame].append(mean_reqests_adapt)
-
-                try:
-                    mean_time_adapt[adapt_frame].append((buff_adapt[adapt_frame][i] / (prob * sensors_count)))
-                except RuntimeWarning:
-                    mean_time_adapt[adapt_frame].append(0)
-                except ZeroDivisionError:
-                    mean_time_adapt[adapt_frame].append(0)
-                except IndexError:
-                    pass
-
+                    mean_time_adapt[adapt_frame].append(adapt_stats.sojourn_mean)
 
                 try:
                     if (prob < 1 / sensors_count and
@@ -88,19 +93,6 @@ if __name__ == "__main__":
                 except IndexError:
                     pass
 
-                print(adapt_frame/10)
-
-        try:
-            if buffer_mean:
-                mean_time.append(buffer_mean[i] / (prob * sensors_count))
-
-        except RuntimeWarning:
-            continue
-        except ZeroDivisionError:
-            pass
-        except IndexError:
-            pass
-
     requests_for_plot = dict(y_type="log")
     times_for_plot = dict(y_type="log")
 
@@ -144,7 +136,13 @@ if __name__ == "__main__":
 
     if overflow_point:
         # key_init(overflow_point, key="x_axis", data=adaptation_frames)
-        overflow_point[""]["value"] = [1/sensors_count, 0.0938, 0.03898, 0.0108]
+        # точки переполнения ищутся делением пополам по вероятности вместо перебора сетки
+        saturation = [saturation_point(adjacency_matrix, adaptation=adapt_frame, seed=seed, frame=frame)
+                      for adapt_frame in adaptation_frames]
+        for adapt_frame, point in zip(adaptation_frames, saturation):
+            print("Порядок адаптации {}: p = {:.5f} +- {:.5f}, пропускная способность {:.3f}".format(
+                adapt_frame, point.prb, point.error, point.throughput))
+        overflow_point[""]["value"] = [point.prb for point in saturation]
 
         # overflow_point[""]["value"] = list(reversed(overflow_point[""]["value"]))
         overflow_point[""]["x_axis"] = adaptation_frames
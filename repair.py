@@ -0,0 +1,479 @@
+from collections import namedtuple
+from heapq import heappop, heappush
+from itertools import count
+
+import numpy as np
+from adjacency import as_adjacency
+
+# изменения фрейма одного исправления: удаленные и добавленные доставки (слот, сенсор);
+# renumbered - расписание сжато, номера слотов изменились, фрейм нужно взять заново методом frame()
+FrameDelta = namedtuple('FrameDelta', ['removed', 'added', 'renumbered'])
+
+# расписание сжимается, когда пустые слоты составляют больше 1 / _EMPTY_RATIO слотов
+_EMPTY_RATIO = 8
+
+
+class IncrementalSchedule(object):
+    """
+    Расписание, которое исправляется при изменении количества сообщений в сенсорах.
+
+    Хранятся все передачи расписания по слотам, доставки на БС каждого слота и счетчики
+    блокировок каждого слота (сколько передач слота блокируют сенсор на передачу и на прием,
+    см. interference.SlotLocks). При обновлении лишние сообщения сенсоров удаляются вместе
+    со своими передачами, а новые сообщения вставляются в первые подходящие слоты.
+
+    Новые сообщения маршрутизируются по дереву путей до БС, построенному один раз при создании:
+    на каждом шаге выбирается сосед, который по дереву ближе к БС, с наименьшей суммой текущего
+    веса связи (с нагрузкой балансировки) и расстояния соседа по дереву. Поэтому маршрут
+    стоит O(длина пути x степень сенсора) вместо алгоритма Дейкстры по всей сети.
+
+    Так же исправляется расписание при изменении топологии (отказ, появление и перемещение
+    сенсоров, изменение связей): перемаршрутизируются только сообщения, проходившие по удаленным
+    связям или попавшие в конфликт из-за новых связей, счетчики блокировок меняются только
+    в слотах передач концов измененных связей, а от дерева отсоединяются и присоединяются
+    заново (алгоритмом Дейкстры только по ним) поддеревья под удаленными связями дерева.
+    Новые связи между сенсорами, уже связанными с БС, дерево не меняют. Смежность общая
+    с RoutingGraph, изменение связи в ней стоит O(n) на сдвиг списков CSR с малой константой.
+    Сообщения сенсоров, недостижимых из БС, ждут в waiting, пока путь до БС не появится.
+
+    Номера слотов не меняются при исправлениях: опустевшие слоты в конце расписания удаляются,
+    а внутри остаются, пока их не больше 1 / _EMPTY_RATIO слотов, и заполняются новыми передачами.
+    Сжатие перенумеровывает все передачи, но бывает не чаще, чем раз на len / _EMPTY_RATIO
+    опустевших слотов. Исправления возвращают изменения фрейма (FrameDelta), весь фрейм
+    за O(длина фрейма) строит frame().
+
+    Для поиска слота у каждого сенсора есть битовые маски слотов, где он заблокирован на передачу
+    и на прием (целые числа Python), поэтому первый подходящий слот находится несколькими
+    операциями над масками вместо перебора слотов. Операция над маской стоит
+    O(длина фрейма / 64) машинных слов, но выполняется целиком в C.
+    """
+
+    def __init__(self, adj, graph, log, sens_buf):
+        """
+        :param adj: SparseAdjacency или матрица смежности
+        :param graph: RoutingGraph с весами балансировки после построения расписания
+        :param log: передачи расписания (слот, передатчик, приемник, сообщение), см. rasp_create
+        :param sens_buf: количество сообщений в каждом сенсоре, по которому строилось расписание
+        """
+        adj = as_adjacency(adj)
+        sens_num = len(adj)
+        self.graph = graph
+        self.sens_buf = [0] + [int(b) for b in sens_buf[1:]]
+
+        self.slots = []  # передачи (передатчик, приемник, сообщение) каждого слота
+        self.deliveries = []  # источники сообщений, доходящих до БС в каждом слоте
+        self.trans_lock = []  # сенсор -> количество блокировок на передачу в слоте
+        self.receive_lock = []  # сенсор -> количество блокировок на прием в слоте
+        self.hops = {}  # сообщение -> список передач (слот, передатчик, приемник)
+        self.origin = {}  # сообщение -> источник
+        self.messages = [[] for _ in range(sens_num)]  # сообщения каждого сенсора
+        self.passing = [set() for _ in range(sens_num)]  # сообщения с передачами из сенсора или в него
+        self.routes_p_node = [0] * sens_num  # количество маршрутов через сенсор
+        self.waiting = {}  # сенсор -> количество сообщений, которые не доходят до БС
+        self._next_msg = 0
+        self._empty = 0  # количество пустых слотов
+        self._removed, self._added = [], []  # изменения фрейма текущего исправления
+        # битовые маски слотов, где сенсор заблокирован на передачу и на прием,
+        # строятся после загрузки передач
+        self.trans_busy = self.receive_busy = None
+
+        for slot_num, source, receive, msg in log:
+            if msg not in self.hops:
+                self._new_message(source, msg)
+            self._insert(slot_num, source, receive, msg)
+            self.routes_p_node[source] += 1
+        self._removed, self._added = [], []
+        self._index_locks()
+
+        # дерево путей до БС: расстояние по дереву (None - нет пути), родитель и дети
+        self.cost, self.parent = graph.shortest_path_tree()
+        self.children = [set() for _ in range(sens_num)]
+        for i, p in enumerate(self.parent):
+            if p >= 0:
+                self.children[p].add(i)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def frame(self):
+        """
+        :return: фрейм, список слотов с сенсорами, сообщения которых уходят на БС
+        """
+        return [list(slot) for slot in self.deliveries]
+
+    def _new_message(self, sensor, msg=None):
+        if msg is None:
+            msg = self._next_msg
+        self._next_msg = max(self._next_msg, msg + 1)
+        self.hops[msg] = []
+        self.origin[msg] = sensor
+        self.messages[sensor].append(msg)
+        return msg
+
+    def _closed(self, sensor):
+        """Сенсор и его соседи"""
+        return self.graph.neighbors(sensor) + [sensor]
+
+    def _count(self, locks, busy, slot_num, sensor, step):
+        """Меняет счетчик блокировок сенсора в слоте, при переходе через 0 - и бит слота в маске"""
+        value = locks.get(sensor, 0) + step
+        if value:
+            locks[sensor] = value
+        else:
+            del locks[sensor]
+        if busy is not None and (value == 0 or value == step):
+            busy[sensor] ^= 1 << slot_num
+
+    def _lock(self, slot_num, source, receive, step):
+        trans_lock, receive_lock = self.trans_lock[slot_num], self.receive_lock[slot_num]
+        for j in self._closed(source):
+            self._count(receive_lock, self.receive_busy, slot_num, j, step)
+        for j in self._closed(receive) + [source]:
+            self._count(trans_lock, self.trans_busy, slot_num, j, step)
+
+    def _index_locks(self):
+        """Строит маски занятых слотов всех сенсоров по счетчикам блокировок"""
+        sens_num = len(self.messages)
+        for name, slot_locks in (('trans_busy', self.trans_lock), ('receive_busy', self.receive_lock)):
+            busy_slots = [[] for _ in range(sens_num)]
+            for slot_num, locks in enumerate(slot_locks):
+                for sensor in locks:
+                    busy_slots[sensor].append(slot_num)
+            masks = [0] * sens_num
+            for sensor, slots in enumerate(busy_slots):
+                if slots:
+                    bits = np.zeros(slots[-1] + 1, dtype=bool)
+                    bits[slots] = True
+                    masks[sensor] = int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+            setattr(self, name, masks)
+
+    def _insert(self, slot_num, source, receive, msg):
+        while slot_num >= len(self.slots):
+            self.slots.append([])
+            self.deliveries.append([])
+            self.trans_lock.append({})
+            self.receive_lock.append({})
+            self._empty += 1
+        if not self.slots[slot_num]:
+            self._empty -= 1
+        self.slots[slot_num].append((source, receive, msg))
+        self._lock(slot_num, source, receive, 1)
+        self.hops[msg].append((slot_num, source, receive))
+        self.passing[source].add(msg)
+        self.passing[receive].add(msg)
+        if receive == 0:
+            self.deliveries[slot_num].append(self.origin[msg])
+            self._added.append((slot_num, self.origin[msg]))
+
+    def _remove_message(self, msg):
+        origin = self.origin.pop(msg)
+        path = [source for _, source, _ in self.hops[msg]] + [0]
+        self.graph.remove_load(reversed(path), self.routes_p_node)
+        for slot_num, source, receive in self.hops.pop(msg):
+            self.slots[slot_num].remove((source, receive, msg))
+            if not self.slots[slot_num]:
+                self._empty += 1
+            self._lock(slot_num, source, receive, -1)
+            self.routes_p_node[source] -= 1
+            self.passing[source].discard(msg)
+            self.passing[receive].discard(msg)
+            if receive == 0:
+                self.deliveries[slot_num].remove(origin)
+                self._removed.append((slot_num, origin))
+        self.messages[origin].remove(msg)
+
+    def _add_message(self, sensor, path):
+        msg = self._new_message(sensor)
+        for j in path[:-1]:
+            self.routes_p_node[j] += 1
+        self.graph.add_load(reversed(path), self.routes_p_node)
+        # каждая следующая передача - в первом подходящем слоте после предыдущей:
+        # младший нулевой бит объединения масок передатчика и приемника
+        slot_num = -1
+        for source, receive in zip(path, path[1:]):
+            busy = (self.trans_busy[source] | self.receive_busy[receive]) >> (slot_num + 1)
+            slot_num += (~busy & (busy + 1)).bit_length()
+            self._insert(slot_num, source, receive, msg)
+
+    def _compact(self):
+        """Удаляет слоты без передач и перенумеровывает передачи"""
+        keep = [slot_num for slot_num, slot in enumerate(self.slots) if slot]
+        new_num = {old: new for new, old in enumerate(keep)}
+        self.slots = [self.slots[k] for k in keep]
+        self.deliveries = [self.deliveries[k] for k in keep]
+        self.trans_lock = [self.trans_lock[k] for k in keep]
+        self.receive_lock = [self.receive_lock[k] for k in keep]
+        for msg, hops in self.hops.items():
+            self.hops[msg] = [(new_num[slot_num], source, receive) for slot_num, source, receive in hops]
+        self._empty = 0
+        self._index_locks()
+
+    def _finish(self):
+        """
+        Завершает исправление: удаляет пустые слоты в конце и сжимает расписание,
+        если внутри слишком много пустых слотов
+        :return: FrameDelta исправления
+        """
+        while self.slots and not self.slots[-1]:
+            for slots in (self.slots, self.deliveries, self.trans_lock, self.receive_lock):
+                slots.pop()
+            self._empty -= 1
+        renumbered = self._empty * _EMPTY_RATIO > len(self.slots)
+        if renumbered:
+            self._compact()
+        delta = FrameDelta(self._removed, self._added, renumbered)
+        self._removed, self._added = [], []
+        return delta
+
+    def _path(self, sensor):
+        """
+        Путь сенсора до БС по дереву с учетом текущих весов связей
+        :return: путь от сенсора до БС, None - сенсор не связан с БС
+        """
+        cost, graph = self.cost, self.graph
+        if cost[sensor] is None:
+            return None
+        indptr, indices, links, weights = graph.indptr, graph.indices, graph.links, graph.weights
+        path = [sensor]
+        while path[-1] != 0:
+            v = path[-1]
+            # родитель всегда ближе к БС, поэтому шаг найдется и путь закончится на БС
+            best, step = None, self.parent[v]
+            for k in range(indptr[v], indptr[v + 1]):
+                u = indices[k]
+                if cost[u] is not None and cost[u] < cost[v]:
+                    d = weights[links[k]] + cost[u]
+                    if best is None or d < best:
+                        best, step = d, u
+            path.append(step)
+        return path
+
+    def _detach(self, sensor):
+        """
+        Отсоединяет сенсор с его поддеревом от дерева путей
+        :return: отсоединенные сенсоры
+        """
+        if self.cost[sensor] is None or sensor == 0:
+            return []
+        self.children[self.parent[sensor]].discard(sensor)
+        detached, stack = [], [sensor]
+        while stack:
+            v = stack.pop()
+            detached.append(v)
+            stack.extend(self.children[v])
+            self.children[v] = set()
+            self.parent[v], self.cost[v] = -1, None
+        return detached
+
+    def _attach(self, sensors):
+        """
+        Присоединяет отсоединенные сенсоры к дереву путей алгоритмом Дейкстры от их соседей
+        в дереве; поиск идет только по отсоединенным сенсорам, сенсоры без пути до БС
+        остаются отсоединенными
+        :param sensors: сенсоры, с которых начинается поиск, присоединенные пропускаются
+        """
+        cost, graph = self.cost, self.graph
+        indptr, indices, links, weights = graph.indptr, graph.indices, graph.links, graph.weights
+        counter = count()
+        fringe = []
+        for v in sensors:
+            if cost[v] is None:
+                for k in range(indptr[v], indptr[v + 1]):
+                    u = indices[k]
+                    if cost[u] is not None:
+                        heappush(fringe, (cost[u] + weights[links[k]], next(counter), v, u))
+        while fringe:
+            d, _, v, p = heappop(fringe)
+            if cost[v] is not None:
+                continue
+            cost[v], self.parent[v] = d, p
+            self.children[p].add(v)
+            for k in range(indptr[v], indptr[v + 1]):
+                u = indices[k]
+                if cost[u] is None:
+                    heappush(fringe, (d + weights[links[k]], next(counter), u, v))
+
+    def update(self, sens_buf):
+        """
+        Исправляет расписание под новое количество сообщений в сенсорах.
+        Изменившиеся сенсоры находятся сравнением векторов в numpy, дальше - как set_messages
+        :param sens_buf: количество сообщений в каждом сенсоре
+        :return: FrameDelta
+        """
+        new = np.asarray(sens_buf, dtype=np.int64)[:len(self.sens_buf)]
+        changed = np.flatnonzero(new != np.asarray(self.sens_buf[:len(new)], dtype=np.int64)).tolist()
+        return self.set_messages({i: int(new[i]) for i in changed if i > 0})
+
+    def set_messages(self, changes):
+        """
+        Исправляет расписание под новое количество сообщений в изменившихся сенсорах
+        :param changes: словарь сенсор -> новое количество сообщений
+        :return: FrameDelta
+        """
+        added = []
+        for i, messages in changes.items():
+            change = int(messages) - self.sens_buf[i]
+            if change < 0 and i in self.waiting:
+                # сначала отменяются сообщения, которые не доходят до БС
+                dropped = min(-change, self.waiting[i])
+                self.waiting[i] -= dropped
+                if not self.waiting[i]:
+                    del self.waiting[i]
+                change += dropped
+            if change < 0:
+                # удаляются сообщения, которые доходят до БС позже всех
+                last = sorted(self.messages[i], key=lambda m: self.hops[m][-1][0])
+                for msg in last[change:]:
+                    self._remove_message(msg)
+            elif change > 0:
+                added.append((i, change))
+            self.sens_buf[i] = int(messages)
+
+        self._add_messages(added)
+        return self._finish()
+
+    def _add_messages(self, added):
+        """
+        Маршрутизирует и вставляет новые сообщения; сообщения недостижимых из БС сенсоров
+        откладываются в waiting
+        :param added: пары (сенсор, количество сообщений)
+        """
+        cost = self.cost
+        # как в balanced_routes, сначала сообщения ближних к БС сенсоров
+        for i, change in sorted(added, key=lambda item: (cost[item[0]] is None, cost[item[0]] or 0)):
+            path = self._path(i)
+            if path is None:
+                self.waiting[i] = self.waiting.get(i, 0) + change
+                continue
+            for _ in range(change):
+                self._add_message(i, path)
+
+    def _link_weight(self, i, j):
+        """
+        Вес новой связи с нагрузкой ее концов: add_load при k-м маршруте через сенсор
+        увеличивает веса его связей на 2k / n^2, всего на R(R + 1) / n^2 для R маршрутов
+        """
+        load = [self.routes_p_node[v] * (self.routes_p_node[v] + 1) for v in (i, j)]
+        return 1.0 + sum(load) / len(self.graph) ** 2
+
+    def change_links(self, added=(), removed=()):
+        """
+        Добавляет и удаляет связи сети и исправляет расписание.
+        Ожидающие сообщения снова маршрутизируются, так как у сенсоров мог появиться путь до БС.
+        Событие топологии - одна перемаршрутизация затронутых сообщений и одно изменение фрейма:
+        O(затронутые сообщения x длина пути x степень сенсора) на маршруты и блокировки,
+        O(размер отсоединенных поддеревьев) на дерево и O(n) на сдвиг списков CSR за связь.
+        add_sensor, remove_sensor и move_sensor сводятся к одному вызову
+        :param added: новые связи (i, j)
+        :param removed: удаляемые связи (i, j)
+        :return: FrameDelta
+        """
+        return self._change_links(added, removed, {})
+
+    def _change_links(self, added, removed, rerouted):
+        """
+        :param rerouted: сенсор -> количество новых сообщений, которые вставляются
+                         вместе с перемаршрутизированными
+        """
+        added, removed = [tuple(link) for link in added], [tuple(link) for link in removed]
+        gone = set(removed) | {(j, i) for i, j in removed}
+
+        # сообщения, которые передаются по удаляемым связям, маршрутизируются заново
+        for i, messages in self.waiting.items():
+            rerouted[i] = rerouted.get(i, 0) + messages
+        self.waiting = {}
+        for i, _ in gone:
+            for msg in list(self.passing[i]):
+                if msg in self.hops and any((s, r) in gone for _, s, r in self.hops[msg]):
+                    rerouted[self.origin[msg]] = rerouted.get(self.origin[msg], 0) + 1
+                    self._remove_message(msg)
+
+        # удаленная связь дерева отсоединяет поддерево, новая связь может присоединить сенсоры
+        detached = []
+        for i, j in removed:
+            self.graph.remove_edge(i, j)
+            if self.parent[i] == j:
+                detached += self._detach(i)
+            elif self.parent[j] == i:
+                detached += self._detach(j)
+        for i, j in added:
+            self.graph.add_edge(i, j, self._link_weight(i, j))
+            detached += [i, j]
+        self._attach(detached)
+
+        # сосед, появившийся у сенсора v, блокируется в слотах передач v: на прием - если v передает,
+        # на передачу - если v принимает; исчезнувший сосед разблокируется
+        changes = [(i, j, 1) for i, j in added] + [(j, i, 1) for i, j in added]
+        changes += [(i, j, -1) for i, j in removed] + [(j, i, -1) for i, j in removed]
+        raised = []
+        for v, u, step in changes:
+            for msg in self.passing[v]:
+                for slot_num, source, receive in self.hops[msg]:
+                    if source == v:
+                        locks, busy = self.receive_lock[slot_num], self.receive_busy
+                    elif receive == v:
+                        locks, busy = self.trans_lock[slot_num], self.trans_busy
+                    else:
+                        continue
+                    self._count(locks, busy, slot_num, u, step)
+                    if step > 0:
+                        raised.append((slot_num, u))
+
+        # новая блокировка сенсора u - конфликт, если в слоте u передает или принимает:
+        # своя передача блокирует передатчик на передачу дважды, приемник на прием - один раз;
+        # из двух конфликтующих сообщений удаляется одно, второе после этого проверяется заново
+        candidates = sorted({(slot_num, msg) for slot_num, u in set(raised)
+                             for source, receive, msg in self.slots[slot_num] if u in (source, receive)})
+        for slot_num, msg in candidates:
+            if msg in self.hops and any(
+                    hop_slot == slot_num and (self.trans_lock[slot_num].get(source, 0) > 2 or
+                                              self.receive_lock[slot_num].get(receive, 0) > 1)
+                    for hop_slot, source, receive in self.hops[msg]):
+                rerouted[self.origin[msg]] = rerouted.get(self.origin[msg], 0) + 1
+                self._remove_message(msg)
+
+        self._add_messages(list(rerouted.items()))
+        return self._finish()
+
+    def add_edge(self, i, j):
+        """Добавляет связь i - j, см. change_links"""
+        return self.change_links(added=[(i, j)])
+
+    def remove_edge(self, i, j):
+        """Удаляет связь i - j, см. change_links"""
+        return self.change_links(removed=[(i, j)])
+
+    def remove_sensor(self, i):
+        """
+        Отказ сенсора: его сообщения удаляются, связи пропадают, номер сенсора сохраняется
+        :return: FrameDelta
+        """
+        for msg in list(self.messages[i]):
+            self._remove_message(msg)
+        self.sens_buf[i] = 0
+        self.waiting.pop(i, None)
+        return self.change_links(removed=[(i, j) for j in self.graph.neighbors(i)])
+
+    def move_sensor(self, i, neighbors):
+        """
+        Перемещение сенсора: его связи заменяются связями с neighbors, сообщения сохраняются
+        :return: FrameDelta
+        """
+        old, new = set(self.graph.neighbors(i)), set(neighbors)
+        return self.change_links(added=[(i, j) for j in sorted(new - old)],
+                                 removed=[(i, j) for j in sorted(old - new)])
+
+    def add_sensor(self, neighbors, messages=1):
+        """
+        Появление нового сенсора: связи и сообщения вставляются одним исправлением
+        :param neighbors: соседи нового сенсора
+        :param messages: количество сообщений в новом сенсоре
+        :return: номер нового сенсора и FrameDelta
+        """
+        i = self.graph.add_sensor()
+        for per_sensor, value in ((self.messages, []), (self.passing, set()), (self.children, set()),
+                                  (self.routes_p_node, 0), (self.parent, -1), (self.cost, None),
+                                  (self.trans_busy, 0), (self.receive_busy, 0),
+                                  (self.sens_buf, messages)):
+            per_sensor.append(value)
+        return i, self._change_links([(i, j) for j in neighbors], [], {i: messages} if messages else {})
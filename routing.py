@@ -0,0 +1,286 @@
+from bisect import bisect_left
+from heapq import heappop, heappush
+from itertools import count
+from math import ceil, sqrt
+
+import numpy as np
+from adjacency import SparseAdjacency, as_adjacency
+
+
+class RoutingGraph(object):
+    """
+    Взвешенный граф сенсорной сети для построения маршрутов.
+
+    Хранит CSR-смежность в виде списков, номер ребра для каждой записи CSR
+    (ребро (i, j) записано в строках обоих сенсоров) и веса ребер.
+    Порядок сенсоров по расстоянию до БС считается один раз и сбрасывается
+    при изменении весов. Связи и сенсоры можно добавлять и удалять на месте,
+    номера связей и сенсоров при этом не меняются.
+    """
+
+    def __init__(self, adj):
+        """
+        :param adj: SparseAdjacency или матрица смежности
+        """
+        adj = as_adjacency(adj)
+        n = len(adj)
+        rows = np.repeat(np.arange(n, dtype=np.int64), adj.degrees())
+        cols = adj.indices.astype(np.int64)
+        keys = np.minimum(rows, cols) * n + np.maximum(rows, cols)
+        link_keys = np.unique(keys)
+
+        self.indptr = adj.indptr.tolist()
+        self.indices = adj.indices.tolist()
+        self.links = np.searchsorted(link_keys, keys).tolist()
+        self.weights = [1.0] * len(link_keys)
+        self._order = None
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def shortest_path_tree(self, target=None):
+        """
+        Алгоритм Дейкстры от БС. Равные пути разрешаются так же, как в networkx:
+        родитель меняется только при строго меньшем расстоянии, вершины с равным
+        расстоянием извлекаются в порядке добавления в очередь.
+        :param target: сенсор, на котором можно остановить поиск
+        :return: список расстояний до БС (None для не достигнутых) и список родителей
+        """
+        indptr, indices, links, weights = self.indptr, self.indices, self.links, self.weights
+        dist = [None] * len(self)
+        seen = [float('inf')] * len(self)
+        parent = [-1] * len(self)
+        seen[0] = 0
+        counter = count()
+        fringe = [(0, next(counter), 0)]
+        while fringe:
+            d, _, v = heappop(fringe)
+            if dist[v] is not None:
+                continue
+            dist[v] = d
+            if v == target:
+                break
+            for k in range(indptr[v], indptr[v + 1]):
+                u = indices[k]
+                if dist[u] is None:
+                    vu_dist = d + weights[links[k]]
+                    if vu_dist < seen[u]:
+                        seen[u] = vu_dist
+                        parent[u] = v
+                        heappush(fringe, (vu_dist, next(counter), u))
+        return dist, parent
+
+    def sens_order(self):
+        """
+        Сортирует сенсоры по расстоянию до БС при текущих весах
+        :return: список сенсоров, начиная с БС, недостижимые из БС сенсоры - в конце
+        """
+        if self._order is None:
+            dist, _ = self.shortest_path_tree()
+            self._order = sorted(range(len(self)), key=lambda i: (dist[i] is None, dist[i] or 0))
+        return self._order
+
+    def neighbors(self, i):
+        """Соседи сенсора i по возрастанию номеров"""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def has_edge(self, i, j):
+        """Есть ли связь i - j"""
+        k = bisect_left(self.indices, j, self.indptr[i], self.indptr[i + 1])
+        return k < self.indptr[i + 1] and self.indices[k] == j
+
+    def add_sensor(self):
+        """
+        Добавляет сенсор без связей
+        :return: номер сенсора
+        """
+        self.indptr.append(self.indptr[-1])
+        self._order = None
+        return len(self) - 1
+
+    def add_edge(self, i, j, weight=1.0):
+        """
+        Добавляет связь i - j в строки обоих сенсоров
+        :param weight: вес новой связи
+        """
+        if i == j or self.has_edge(i, j):
+            raise ValueError("Link {} - {} can not be added".format(i, j))
+        link = len(self.weights)
+        self.weights.append(weight)
+        for a, b in ((i, j), (j, i)):
+            k = bisect_left(self.indices, b, self.indptr[a], self.indptr[a + 1])
+            self.indices.insert(k, b)
+            self.links.insert(k, link)
+            self.indptr[a + 1:] = [offset + 1 for offset in self.indptr[a + 1:]]
+        self._order = None
+
+    def remove_edge(self, i, j):
+        """Удаляет связь i - j, ее вес остается неиспользуемым"""
+        if not self.has_edge(i, j):
+            raise ValueError("Link {} - {} does not exist".format(i, j))
+        for a, b in ((i, j), (j, i)):
+            k = bisect_left(self.indices, b, self.indptr[a], self.indptr[a + 1])
+            del self.indices[k]
+            del self.links[k]
+            self.indptr[a + 1:] = [offset - 1 for offset in self.indptr[a + 1:]]
+        self._order = None
+
+    def adjacency(self):
+        """Текущая смежность в виде SparseAdjacency"""
+        return SparseAdjacency(np.array(self.indptr, dtype=np.int64), np.array(self.indices, dtype=np.int32))
+
+    def add_load(self, path, routes_p_node):
+        """
+        Увеличивает веса ребер сенсоров пути пропорционально количеству маршрутов через них
+        :param path: путь от БС до сенсора
+        :param routes_p_node: количество маршрутов через каждый сенсор, уже с учетом пути
+        """
+        indptr, links, weights = self.indptr, self.links, self.weights
+        sens_num = len(self)
+        for j in path:
+            delta = routes_p_node[j] * sens_num ** -2
+            for k in range(indptr[j], indptr[j + 1]):
+                # вес ребра увеличивается со стороны обоих сенсоров
+                weights[links[k]] += delta
+                weights[links[k]] += delta
+        self._order = None
+
+    def remove_load(self, path, routes_p_node):
+        """
+        Отменяет add_load для пути удаляемого маршрута
+        :param path: путь от БС до сенсора
+        :param routes_p_node: количество маршрутов через каждый сенсор, еще с учетом пути
+        """
+        indptr, links, weights = self.indptr, self.links, self.weights
+        sens_num = len(self)
+        for j in path:
+            delta = routes_p_node[j] * sens_num ** -2
+            for k in range(indptr[j], indptr[j + 1]):
+                weights[links[k]] -= 2 * delta
+        self._order = None
+
+
+class Routes(object):
+    """
+    Маршруты сообщений в виде указателей на следующий шаг.
+
+    Маршрут хранится как цепочка записей (сенсор, следующая запись) до БС,
+    запись 0 соответствует БС. Одинаковые окончания маршрутов хранятся один раз,
+    поэтому маршруты по одному дереву занимают не больше n записей и совпадают
+    с массивом следующих сенсоров. Для каждого сообщения хранится только сенсор-источник
+    и первая запись его маршрута.
+    """
+
+    def __init__(self):
+        self.hop_node = [0]  # сенсор записи
+        self.hop_next = [-1]  # следующая запись к БС
+        self.origin = []  # источник каждого сообщения
+        self.start = []  # первая запись маршрута каждого сообщения
+        self._entries = {}
+
+    def __len__(self):
+        return len(self.origin)
+
+    def entry(self, node, next_entry):
+        """Возвращает запись (сенсор, следующая запись), создавая ее при необходимости"""
+        key = (node, next_entry)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = len(self.hop_node)
+            self.hop_node.append(node)
+            self.hop_next.append(next_entry)
+        return entry
+
+    def tree_entries(self, parent):
+        """
+        Возвращает функцию, которая дает запись сенсора в дереве кратчайших путей;
+        записи дерева создаются по мере надобности, каждая один раз.
+        Для сенсора, не достижимого из БС, функция выкидывает ValueError
+        :param parent: список родителей дерева
+        """
+        entries = {0: 0}
+
+        def tree_entry(i):
+            if i not in entries and parent[i] < 0:
+                raise ValueError("Sensor {} is not connected to the base station".format(i))
+            path = []
+            while i not in entries:
+                path.append(i)
+                i = parent[i]
+            entry = entries[i]
+            for node in reversed(path):
+                entry = entries[node] = self.entry(node, entry)
+            return entry
+
+        return tree_entry
+
+    def add(self, origin, start):
+        """
+        Добавляет сообщение
+        :param origin: сенсор-источник
+        :param start: первая запись маршрута
+        :return: номер сообщения
+        """
+        self.origin.append(origin)
+        self.start.append(start)
+        return len(self.origin) - 1
+
+    def path(self, msg):
+        """Возвращает маршрут сообщения от источника до БС"""
+        path, entry = [], self.start[msg]
+        while entry >= 0:
+            path.append(self.hop_node[entry])
+            entry = self.hop_next[entry]
+        return path
+
+
+def balanced_routes(graph, sens_buf, batch=None):
+    """
+    Строит маршруты сообщений с балансировкой нагрузки.
+
+    Сообщения маршрутизируются в порядке удаления сенсоров от БС. Вместо алгоритма
+    Дейкстры для каждого сообщения дерево кратчайших путей строится один раз на
+    группу из batch сообщений, после чего веса обновляются для всей группы сразу.
+    При batch=1 результат совпадает с последовательной балансировкой.
+    :param graph: RoutingGraph, его веса изменяются
+    :param sens_buf: количество сообщений в каждом сенсоре
+    :param batch: размер группы сообщений, по умолчанию корень из числа сообщений
+    :return: Routes
+    """
+    sens_num = len(graph)
+    messages = [i for i in graph.sens_order() if i != 0 for _ in range(sens_buf[i])]
+    if batch is None:
+        batch = max(1, int(ceil(sqrt(len(messages)))))
+
+    routes = Routes()
+    routes_p_node = [0] * sens_num
+    for start in range(0, len(messages), batch):
+        group = messages[start:start + batch]
+        if batch == 1:
+            _, parent = graph.shortest_path_tree(target=group[0])
+        else:
+            _, parent = graph.shortest_path_tree()
+        tree_entry = routes.tree_entries(parent)
+        for i in group:
+            msg = routes.add(i, tree_entry(i))
+            path = routes.path(msg)
+            for j in path[:-1]:
+                routes_p_node[j] += 1
+            graph.add_load(reversed(path), routes_p_node)
+    return routes
+
+
+def shortest_routes(graph, sens_buf):
+    """
+    Строит маршруты сообщений по кратчайшим путям без балансировки
+    :param graph: RoutingGraph
+    :param sens_buf: количество сообщений в каждом сенсоре
+    :return: Routes
+    """
+    _, parent = graph.shortest_path_tree()
+    routes = Routes()
+    tree_entry = routes.tree_entries(parent)
+    for i in range(1, len(graph)):
+        for _ in range(sens_buf[i]):
+            routes.add(i, tree_entry(i))
+    return routes
@@ -0,0 +1,79 @@
+from collections import namedtuple
+
+import numpy as np
+import main
+from adjacency import as_adjacency
+from schedule_cache import ScheduleCache
+from simulation import confidence_interval
+
+SaturationResult = namedtuple('SaturationResult', ['prb', 'error', 'throughput', 'probes'])
+
+
+def _bisect(adj, adaptation, tol, trials, num_of_frames, overflow, seeds, frame, cache):
+    """
+    Один поиск делением пополам
+    :return: границы итогового отрезка и количество моделирований
+    """
+    low, high, probes = 0.0, 1 / (len(adj) - 1), 0
+    while high - low > tol * high:
+        prb = (low + high) / 2
+        unstable = 0
+        for trial in range(trials):
+            mean = main.sens_graph_with_prob(adj, prb=prb, num_of_frames=num_of_frames, adaptation=adaptation,
+                                             frame=frame, rng=np.random.default_rng(seeds.spawn(1)[0]),
+                                             cache=cache, event_driven=True, rel_width=0.05, overflow=overflow)
+            probes += 1
+            unstable += mean > overflow
+            # исход голосования уже известен
+            if 2 * unstable > trials or 2 * (trial + 1 - unstable) >= trials:
+                break
+        if 2 * unstable > trials:
+            high = prb
+        else:
+            low = prb
+    return low, high, probes
+
+
+def saturation_point(adj, adaptation=0, tol=0.02, trials=3, repeats=4, num_of_frames=300, overflow=200,
+                     seed=None, frame=None, confidence=0.95):
+    """
+    Ищет точку переполнения - наибольшую вероятность появления сообщения, при которой система устойчива.
+
+    Поиск делением пополам на отрезке [0, 1 / количество сенсоров]: выше его правого конца
+    БС не успевает принимать сообщения. В каждой пробной точке выполняется trials коротких
+    моделирований с остановкой по точности и по переполнению (см. sens_graph_with_prob),
+    точка считается неустойчивой, если в большинстве из них среднее количество сообщений
+    в системе больше overflow, как в prob_fig. Поиск повторяется repeats раз с независимыми
+    случайными числами, погрешность - доверительный интервал по повторам, но не меньше
+    полуширины отрезка деления.
+    :param adj: SparseAdjacency или матрица смежности сенсорной сети
+    :param adaptation: порядок адаптации, 0 - без адаптации
+    :param tol: ширина итогового отрезка относительно его правого конца
+    :param trials: количество моделирований в каждой пробной точке
+    :param repeats: количество независимых поисков
+    :param num_of_frames: наибольшее количество фреймов одного моделирования
+    :param overflow: количество сообщений в системе, выше которого система переполнена
+    :param seed: начальное значение для потоков случайных чисел
+    :param frame: начальное расписание, если оно уже построено
+    :param confidence: доверительная вероятность погрешности
+    :return: SaturationResult: точка переполнения, ее погрешность, пропускная способность
+             в точке переполнения (сообщений за слот) и количество моделирований
+    """
+    adj = as_adjacency(adj)
+    if frame is None:
+        frame = main.rasp_create(adj, balance=True)
+    seeds = np.random.SeedSequence(seed)
+    # расписания адаптивного режима повторяются между пробными точками
+    cache = ScheduleCache()
+
+    points, bracket, probes = [], 0.0, 0
+    for _ in range(repeats):
+        low, high, search_probes = _bisect(adj, adaptation, tol, trials, num_of_frames, overflow,
+                                           seeds.spawn(1)[0], frame, cache)
+        points.append((low + high) / 2)
+        bracket = max(bracket, (high - low) / 2)
+        probes += search_probes
+
+    ci_low, ci_high = confidence_interval(points, confidence)
+    prb = float(np.mean(points))
+    return SaturationResult(prb, max(bracket, (ci_high - ci_low) / 2), prb * (len(adj) - 1), probes)
@@ -0,0 +1,137 @@
+import os
+
+import numpy as np
+
+# заголовок файла: сигнатура, количество слотов и передач
+_MAGIC = b'RASPSCH1'
+_HEADER = len(_MAGIC) + 16
+
+
+class Schedule(object):
+    """
+    Компактное расписание: все передачи, упорядоченные по слотам, в массивах int32.
+
+    Передачи слота k - элементы slot_offsets[k]:slot_offsets[k + 1] массивов source
+    (передатчик), receive (приемник), origin (источник сообщения) и message (номер сообщения).
+    Расписание сохраняется в двоичный файл из заголовка и этих массивов подряд, поэтому
+    при загрузке массивы отображаются в память (memmap) без чтения и разбора файла,
+    и несколько процессов используют одни страницы файла.
+    """
+
+    def __init__(self, slot_offsets, source, receive, origin, message):
+        """
+        :param slot_offsets: смещения слотов, длина - количество слотов + 1
+        :param source: передатчики
+        :param receive: приемники
+        :param origin: источники сообщений
+        :param message: номера сообщений
+        """
+        self.slot_offsets = slot_offsets
+        self.source = source
+        self.receive = receive
+        self.origin = origin
+        self.message = message
+
+    @classmethod
+    def from_log(cls, log, slots=None):
+        """
+        Строит расписание по передачам rasp_create
+        :param log: передачи (слот, передатчик, приемник, сообщение)
+        :param slots: количество слотов, по умолчанию - до последней передачи
+        :return: Schedule
+        """
+        log = np.asarray(log, dtype=np.int64).reshape(-1, 4)
+        log = log[np.lexsort((log[:, 3], log[:, 0]))]
+        slot, source, receive, message = log.T
+        if slots is None:
+            slots = int(slot[-1]) + 1 if len(log) else 0
+        offsets = np.zeros(slots + 1, dtype=np.int64)
+        np.cumsum(np.bincount(slot, minlength=slots), out=offsets[1:])
+
+        # источник сообщения - передатчик его первой передачи
+        messages, inverse = np.unique(message, return_inverse=True)
+        first = np.full(len(messages), len(log), dtype=np.int64)
+        np.minimum.at(first, inverse, np.arange(len(log)))
+        origin = source[first][inverse]
+        return cls(offsets, source.astype(np.int32), receive.astype(np.int32),
+                   origin.astype(np.int32), message.astype(np.int32))
+
+    def __len__(self):
+        return len(self.slot_offsets) - 1
+
+    def transmissions(self):
+        """Количество передач"""
+        return len(self.source)
+
+    def slots(self):
+        """Номер слота каждой передачи"""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.slot_offsets))
+
+    def log(self):
+        """
+        :return: массив передач (слот, передатчик, приемник, сообщение), как у rasp_create
+        """
+        return np.column_stack((self.slots(), self.source, self.receive, self.message)).astype(np.int64)
+
+    def deliveries(self):
+        """
+        :return: номера слотов и источники сообщений, доходящих до БС
+        """
+        delivered = np.flatnonzero(np.asarray(self.receive) == 0)
+        return self.slots()[delivered], np.asarray(self.origin)[delivered].astype(np.int64)
+
+    def frame(self):
+        """
+        :return: фрейм, как у rasp_create
+        """
+        frame = [[] for _ in range(len(self))]
+        for slot_num, sensor in zip(*(array.tolist() for array in self.deliveries())):
+            frame[slot_num].append(sensor)
+        return frame
+
+    def arrays(self):
+        """Массивы расписания по именам параметров конструктора"""
+        return dict(slot_offsets=self.slot_offsets, source=self.source, receive=self.receive,
+                    origin=self.origin, message=self.message)
+
+    def save(self, path):
+        """
+        Сохраняет расписание в двоичный файл
+        :param path: имя файла
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(np.array([len(self), self.transmissions()], dtype='<i8').tobytes())
+            f.write(np.ascontiguousarray(self.slot_offsets, dtype='<i8').tobytes())
+            for array in (self.source, self.receive, self.origin, self.message):
+                f.write(np.ascontiguousarray(array, dtype='<i4').tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Загружает расписание из файла save
+        :param path: имя файла
+        :param mmap: отобразить массивы в память только для чтения, иначе прочитать их
+        :return: Schedule
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError("'{}' is not a schedule file".format(path))
+            slots, hops = np.frombuffer(f.read(16), dtype='<i8').tolist()
+
+        def array(dtype, count, offset):
+            if not count:
+                return np.zeros(0, dtype=dtype)
+            if mmap:
+                return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+            return np.fromfile(path, dtype=dtype, count=count, offset=offset)
+
+        offsets = array('<i8', slots + 1, _HEADER)
+        position = _HEADER + 8 * (slots + 1)
+        arrays = []
+        for _ in range(4):
+            arrays.append(array('<i4', hops, position))
+            position += 4 * hops
+        return cls(offsets, *arrays)
@@ -0,0 +1,86 @@
+import os
+import pickle
+from collections import OrderedDict
+
+
+class ScheduleCache(object):
+    """
+    Кэш расписаний с вытеснением давно не использованных (LRU).
+
+    Ключ расписания - отпечаток топологии (SparseAdjacency.fingerprint), вектор
+    количества сообщений в сенсорах, по которому строилось расписание, и параметры
+    построения (способ заполнения слотов и др.), если кэш общий для них. В адаптивном
+    режиме при малой нагрузке одни и те же векторы повторяются, и расписание
+    для них строится один раз. Кэш можно сохранить на диск и загрузить при создании.
+    """
+
+    def __init__(self, maxsize=128, path=None):
+        """
+        :param maxsize: максимальное количество расписаний в кэше
+        :param path: файл для сохранения кэша, если он существует, кэш загружается из него
+        """
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        if path is not None and os.path.exists(path):
+            with open(path, 'rb') as f:
+                self._items = pickle.load(f)
+            self._evict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    @staticmethod
+    def key(adj, sens_buf, key_extra=()):
+        """
+        Ключ расписания
+        :param adj: SparseAdjacency сенсорной сети
+        :param sens_buf: количество сообщений в каждом сенсоре
+        :param key_extra: параметры построения расписания, которые различают расписания
+        """
+        return adj.fingerprint(), tuple(int(b) for b in sens_buf), tuple(key_extra)
+
+    def get(self, adj, sens_buf, build, key_extra=()):
+        """
+        Возвращает расписание из кэша или строит его
+        :param adj: SparseAdjacency сенсорной сети
+        :param sens_buf: количество сообщений в каждом сенсоре
+        :param build: функция без аргументов, которая строит расписание при промахе
+        :param key_extra: параметры построения расписания, например способ заполнения слотов
+        :return: расписание
+        """
+        key = self.key(adj, sens_buf, key_extra)
+        if key in self._items:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key]
+        self.misses += 1
+        value = self._items[key] = build()
+        self._evict()
+        return value
+
+    def _evict(self):
+        """Удаляет давно не использованные расписания сверх maxsize"""
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        """Очищает кэш и счетчики"""
+        self._items.clear()
+        self.hits = self.misses = 0
+
+    def save(self, path=None):
+        """
+        Сохраняет кэш на диск
+        :param path: файл, по умолчанию path из конструктора
+        """
+        path = path or self.path
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self._items, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
@@ -0,0 +1,333 @@
+from collections import deque, namedtuple
+from math import sqrt
+from statistics import NormalDist
+
+import numpy as np
+from schedule import Schedule
+
+# сколько ячеек слот x сенсор генерируется за один раз
+CHUNK_CELLS = 1 << 20
+
+
+class ArrivalStream(object):
+    """
+    Поток появления сообщений в сенсорах.
+
+    Появления сообщений генерируются блоками по chunk слотов по мере продвижения
+    моделирования, поэтому расход памяти не зависит от длины моделирования,
+    а на слоты после его окончания не тратится время.
+    """
+
+    def __init__(self, sens_count, prb, chunk=None, rng=None):
+        """
+        :param sens_count: количество сенсоров без БС
+        :param prb: вероятность появления сообщения в каждом слоте в каждом сенсоре
+        :param chunk: количество слотов в блоке, по умолчанию блок занимает CHUNK_CELLS ячеек
+        :param rng: генератор случайных чисел numpy, по умолчанию np.random
+        """
+        self.sens_count = sens_count
+        self.prb = prb
+        self.chunk = chunk or max(1, CHUNK_CELLS // max(sens_count, 1))
+        self.rng = rng if rng is not None else np.random
+        self._block = np.zeros((0, sens_count), dtype=np.int64)
+        self._pos = 0
+
+    def _refill(self):
+        """Генерирует следующий блок, если текущий закончился"""
+        if self._pos >= len(self._block):
+            self._block = self.rng.binomial(1, self.prb, size=[self.chunk, self.sens_count])
+            self._pos = 0
+
+    def take(self, slots):
+        """
+        Возвращает появления сообщений за следующие slots слотов
+        :return: массив slots x sens_count из 0 и 1
+        """
+        parts = []
+        while slots > 0:
+            self._refill()
+            part = self._block[self._pos:self._pos + slots]
+            self._pos += len(part)
+            slots -= len(part)
+            parts.append(part)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts) if parts else self._block[:0]
+
+
+class ArrivalEvents(object):
+    """
+    Поток появления сообщений в виде отдельных событий.
+
+    Ячейки слот x сенсор нумеруются подряд по слотам, и вместо розыгрыша каждой
+    ячейки разыгрываются геометрические промежутки между ячейками с сообщениями.
+    Это тот же поток испытаний Бернулли, что и у ArrivalStream, но его стоимость
+    пропорциональна количеству сообщений, а слоты без сообщений можно пропускать.
+    """
+
+    def __init__(self, sens_count, prb, chunk=1 << 16, rng=None):
+        """
+        :param sens_count: количество сенсоров без БС
+        :param prb: вероятность появления сообщения в каждом слоте в каждом сенсоре
+        :param chunk: количество промежутков, разыгрываемых за один раз
+        :param rng: генератор случайных чисел numpy, по умолчанию np.random
+        """
+        self.sens_count = sens_count
+        self.prb = prb
+        self.chunk = chunk
+        self.rng = rng if rng is not None else np.random
+        self._cells = np.zeros(0, dtype=np.int64)  # разыгранные ячейки с сообщениями
+        self._pos = 0  # первая еще не выданная ячейка в _cells
+        self._origin = 0  # номер первой ячейки текущего слота
+        self._last = -1  # последняя разыгранная ячейка
+
+    def _extend(self, cell):
+        """Разыгрывает сообщения, пока не будут известны все ячейки до cell включительно"""
+        while self._last < cell:
+            gaps = self.rng.geometric(self.prb, size=self.chunk)
+            new_cells = self._last + np.cumsum(gaps)
+            self._last = int(new_cells[-1])
+            self._cells = np.concatenate((self._cells[self._pos:], new_cells))
+            self._pos = 0
+
+    def _empty(self):
+        return self.prb <= 0 or self.sens_count == 0
+
+    def _advance(self, slots):
+        """Переходит на slots слотов вперед, возвращает ячейки с сообщениями от начала этих слотов"""
+        end_cell = self._origin + slots * self.sens_count
+        if self._empty():
+            self._origin = end_cell
+            return self._cells[:0]
+        self._extend(end_cell - 1)
+        end = int(np.searchsorted(self._cells, end_cell))
+        events = self._cells[self._pos:end] - self._origin
+        self._pos, self._origin = end, end_cell
+        return events
+
+    def idle_slots(self):
+        """Количество ближайших слотов без сообщений"""
+        if self._empty():
+            return np.iinfo(np.int64).max
+        if self._pos == len(self._cells):
+            self._extend(self._last + 1)
+        return (int(self._cells[self._pos]) - self._origin) // self.sens_count
+
+    def take(self, slots):
+        """
+        Возвращает появления сообщений за следующие slots слотов
+        :return: номера слотов от начала и номера сенсоров без БС для каждого сообщения
+        """
+        events = self._advance(slots)
+        return events // self.sens_count, events % self.sens_count
+
+    def skip(self, slots):
+        """Пропускает slots слотов, появления сообщений в них отбрасываются"""
+        self._advance(slots)
+
+
+def compile_frame(frame, sens_num, period=None):
+    """
+    Переводит фрейм в моменты ухода сообщений каждого сенсора.
+
+    Для сенсора i с уходами в слотах d_1 < d_2 < ... сохраняются суммы
+    (len - d_1) + ... + (len - d_k) для всех k: на столько слотов уход первых k сообщений
+    уменьшает суммарное количество сообщений сенсора за фрейм.
+    :param frame: фрейм, список слотов с сенсорами, сообщения которых уходят на БС, или Schedule
+    :param sens_num: количество сенсоров с БС
+    :param period: период повторения для конвейерного расписания (см. main.rasp_pipeline), фреймы
+                   начинаются через period слотов, а уходы могут быть позже начала следующего фрейма
+    :return: длина фрейма, количество уходов каждого сенсора, смещения сенсоров в массиве сумм, массив сумм
+    """
+    # пустой фрейм занимает один слот без уходов
+    length = period or max(len(frame), 1)
+    if isinstance(frame, Schedule):
+        departures = np.unique(np.column_stack(frame.deliveries()), axis=0)
+    else:
+        departures = [(slot_num, i) for slot_num, slot in enumerate(frame) for i in set(slot)]
+        departures = np.array(departures, dtype=np.int64).reshape(-1, 2)
+    departures = departures[np.lexsort((departures[:, 0], departures[:, 1]))]
+    slots, sensors = departures[:, 0], departures[:, 1]
+
+    counts = np.bincount(sensors, minlength=sens_num)
+    # у каждого сенсора counts + 1 сумма, первая из них нулевая
+    offsets = np.zeros(sens_num + 1, dtype=np.int64)
+    np.cumsum(counts + 1, out=offsets[1:])
+    first = np.cumsum(counts) - counts
+    rank = np.arange(len(slots)) - np.repeat(first, counts)
+    gains = np.cumsum(length - slots)
+    gains_before = np.concatenate(([0], gains))[first]
+    sums = np.zeros(offsets[-1], dtype=np.int64)
+    sums[np.repeat(offsets[:-1], counts) + rank + 1] = gains - np.repeat(gains_before, counts)
+    return length, counts, offsets, sums
+
+
+def frame_step(sensors_out, arrivals, compiled):
+    """
+    Моделирует один фрейм целиком.
+
+    Сообщения, пришедшие во время фрейма, ждут его окончания, а из уходящих
+    сообщений сенсора уходят первые min(сообщений, уходов в фрейме). Поэтому сумма
+    сообщений в системе по всем слотам фрейма считается без перебора слотов.
+    Для нескольких независимых реплик массивы имеют дополнительное первое измерение.
+    :param sensors_out: массив сообщений, которые уйдут в этом фрейме, для всех сенсоров с БС
+    :param arrivals: появления сообщений за фрейм, массив длина фрейма x количество сенсоров без БС
+    :param compiled: фрейм после compile_frame
+    :return: уходящие сообщения на следующий фрейм, сумма сообщений в системе по слотам фрейма
+    """
+    length = compiled[0]
+    sensors_out, total_out = _departures(sensors_out, compiled)
+    # сообщение, пришедшее в слоте t, находится в системе до конца фрейма
+    total_in = arrivals.sum(axis=-1) @ np.arange(length, 0, -1)
+    sensors_out[..., 1:] += arrivals.sum(axis=-2)
+    return sensors_out, total_out + total_in
+
+
+def frame_step_events(sensors_out, events, compiled):
+    """
+    То же, что frame_step, для появлений сообщений в виде событий ArrivalEvents.take
+    :param sensors_out: массив сообщений, которые уйдут в этом фрейме, для всех сенсоров с БС
+    :param events: номера слотов и номера сенсоров без БС для каждого пришедшего сообщения
+    :param compiled: фрейм после compile_frame
+    :return: уходящие сообщения на следующий фрейм, сумма сообщений в системе по слотам фрейма
+    """
+    length = compiled[0]
+    slots, sensors = events
+    sensors_out, total_out = _departures(sensors_out, compiled)
+    total_in = length * len(slots) - int(slots.sum())
+    np.add.at(sensors_out, sensors + 1, 1)
+    return sensors_out, total_out + total_in
+
+
+def _departures(sensors_out, compiled):
+    """Уходы сообщений за фрейм: оставшиеся уходящие сообщения и их сумма по слотам фрейма"""
+    length, counts, offsets, sums = compiled
+    sent = np.minimum(sensors_out, counts)
+    total_out = length * sensors_out.sum(axis=-1) - sums[offsets[:-1] + sent].sum(axis=-1)
+    return sensors_out - sent, total_out
+
+
+class BatchMeans(object):
+    """
+    Последовательная оценка среднего количества сообщений на слот методом групповых средних.
+
+    Фреймы объединяются в группы по batch_frames фреймов. Когда групп становится
+    2 * batches, соседние группы сливаются и размер группы удваивается, поэтому
+    групп всегда от batches до 2 * batches и память не зависит от длины моделирования.
+    Средние групп считаются независимыми, если их автокорреляция мала.
+    """
+
+    def __init__(self, batches=20, batch_frames=1, max_correlation=0.5):
+        """
+        :param batches: минимальное количество групп для оценки
+        :param batch_frames: начальное количество фреймов в группе
+        :param max_correlation: допустимая автокорреляция соседних групп
+        """
+        self.batches = batches
+        self.batch_frames = batch_frames
+        self.max_correlation = max_correlation
+        self.buff = []  # сумма сообщений по слотам каждой группы
+        self.slots = []  # количество слотов каждой группы
+        self._frames = 0  # количество фреймов в последней группе
+
+    def add(self, buff, slots, frames=1):
+        """
+        Добавляет frames одинаковых фреймов
+        :param buff: сумма сообщений в системе по слотам одного фрейма
+        :param slots: длина фрейма
+        :param frames: количество фреймов
+        """
+        while frames > 0:
+            if not self.buff or self._frames == self.batch_frames:
+                if len(self.buff) == 2 * self.batches:
+                    self.buff = [a + b for a, b in zip(self.buff[::2], self.buff[1::2])]
+                    self.slots = [a + b for a, b in zip(self.slots[::2], self.slots[1::2])]
+                    self.batch_frames *= 2
+                self.buff.append(0)
+                self.slots.append(0)
+                self._frames = 0
+            take = min(frames, self.batch_frames - self._frames)
+            self.buff[-1] += buff * take
+            self.slots[-1] += slots * take
+            self._frames += take
+            frames -= take
+
+    def _means(self):
+        """Средние законченных групп"""
+        full = len(self.buff) if self._frames == self.batch_frames else len(self.buff) - 1
+        return np.array(self.buff[:full], dtype=float) / np.array(self.slots[:full], dtype=float)
+
+    def interval(self, confidence=0.95):
+        """
+        :param confidence: доверительная вероятность
+        :return: среднее по законченным группам и полуширина доверительного интервала,
+                 полуширина бесконечна, если групп меньше batches
+        """
+        means = self._means()
+        if len(means) < max(self.batches, 2):
+            return (means.mean() if len(means) else 0.0), float('inf')
+        slots = sum(self.slots[:len(means)])
+        mean = sum(self.buff[:len(means)]) / slots
+        return mean, NormalDist().inv_cdf((1 + confidence) / 2) * means.std(ddof=1) / sqrt(len(means))
+
+    def converged(self, rel_width, confidence=0.95):
+        """
+        Проверяет, что полуширина доверительного интервала не больше rel_width от среднего,
+        а средние групп не коррелированы
+        """
+        mean, half = self.interval(confidence)
+        if half > rel_width * abs(mean):
+            return False
+        means = self._means()
+        centered = means - means.mean()
+        var = centered @ centered
+        return var == 0 or centered[1:] @ centered[:-1] / var <= self.max_correlation
+
+
+class DivergenceDetector(object):
+    """
+    Обнаружение переполнения: количество сообщений в системе больше порога
+    и значимо растет на последних window фреймах (наклон линейной регрессии
+    больше двух стандартных ошибок).
+    """
+
+    def __init__(self, threshold, window=8):
+        """
+        :param threshold: количество сообщений в системе, ниже которого рост не проверяется
+        :param window: количество последних фреймов для оценки роста
+        """
+        self.threshold = threshold
+        self.window = window
+        self.backlog = deque(maxlen=window)
+
+    def add(self, backlog):
+        """Добавляет количество сообщений в системе в конце фрейма"""
+        self.backlog.append(backlog)
+
+    def diverged(self):
+        if len(self.backlog) < self.window or self.backlog[-1] <= self.threshold:
+            return False
+        y = np.array(self.backlog, dtype=float)
+        x = np.arange(len(y)) - (len(y) - 1) / 2
+        slope = x @ y / (x @ x)
+        residual = y - y.mean() - slope * x
+        error = sqrt(residual @ residual / (len(y) - 2) / (x @ x))
+        return slope > 2 * error
+
+
+ReplicaResult = namedtuple('ReplicaResult', ['means', 'mean', 'ci'])
+
+
+def confidence_interval(values, confidence=0.95):
+    """
+    Доверительный интервал среднего по нормальному приближению
+    :param values: независимые оценки
+    :param confidence: доверительная вероятность
+    :return: (нижняя граница, верхняя граница)
+    """
+    values = np.asarray(values, dtype=float)
+    mean = values.mean()
+    if len(values) < 2:
+        return mean, mean
+    half = NormalDist().inv_cdf((1 + confidence) / 2) * values.std(ddof=1) / sqrt(len(values))
+    return mean - half, mean + half
@@ -0,0 +1,210 @@
+from collections import deque, namedtuple
+
+import numpy as np
+
+SimulationStats = namedtuple('SimulationStats', [
+    'mean',  # среднее количество сообщений в системе по слотам, как у sens_graph_with_prob
+    'sensor_mean',  # среднее количество сообщений каждого сенсора по слотам
+    'sensor_var',  # дисперсия количества сообщений каждого сенсора в конце фреймов
+    'sensor_max',  # наибольшее количество сообщений каждого сенсора в конце фреймов
+    'histogram',  # гистограмма количества сообщений каждого сенсора в конце фреймов, сенсоры x корзины
+    'backlog_mean',  # среднее количество сообщений в системе в конце фреймов
+    'backlog_var',  # дисперсия количества сообщений в системе в конце фреймов
+    'backlog_max',  # наибольшее количество сообщений в системе в конце фреймов
+    'delivered',  # количество сообщений, дошедших до БС
+    'sojourn_mean',  # среднее время пребывания сообщения в системе, в слотах
+    'sojourn_quantiles',  # квантиль -> оценка квантиля времени пребывания
+    'frames',
+    'slots',
+    'diverged',  # моделирование остановлено из-за переполнения
+])
+
+
+class P2Quantile(object):
+    """
+    Оценка квантиля потока значений алгоритмом P² (Jain, Chlamtac, 1985).
+
+    Хранятся только пять маркеров: минимум, максимум, оценка квантиля и две
+    промежуточные точки, высоты которых уточняются кусочно-параболической интерполяцией.
+    """
+
+    def __init__(self, q):
+        """
+        :param q: уровень квантиля от 0 до 1
+        """
+        self.q = q
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, x):
+        """Добавляет значение"""
+        self.count += 1
+        heights, positions, desired = self.heights, self.positions, self.desired
+        if self.count <= 5:
+            heights.append(x)
+            heights.sort()
+            return
+
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = height
+                positions[i] += d
+
+    def _parabolic(self, i, d):
+        heights, positions = self.heights, self.positions
+        return heights[i] + d / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + d) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i]) +
+            (positions[i + 1] - positions[i] - d) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
+
+    def value(self):
+        """Текущая оценка квантиля, nan без значений"""
+        if self.count == 0:
+            return float('nan')
+        if self.count <= 5:
+            return self.heights[min(int(self.q * self.count), self.count - 1)]
+        return self.heights[2]
+
+
+class StatsCollector(object):
+    """
+    Потоковая статистика моделирования буфера.
+
+    Средние по слотам считаются точно по уходам и появлениям сообщений фрейма,
+    дисперсия, максимум и гистограммы - по количеству сообщений в конце фреймов
+    (алгоритм Уэлфорда). Сообщения каждого сенсора уходят в порядке появления,
+    поэтому время пребывания сообщения известно в момент его ухода; хранятся только
+    моменты появления сообщений, которые еще в системе. Память не зависит от длины моделирования.
+    """
+
+    def __init__(self, sens_num, sensors_out, quantiles=(0.5, 0.9, 0.99), bins=32):
+        """
+        :param sens_num: количество сенсоров с БС
+        :param sensors_out: начальные сообщения сенсоров, считаются появившимися в слоте 0
+        :param quantiles: уровни квантилей времени пребывания
+        :param bins: количество корзин гистограмм, последняя корзина - bins-1 сообщений и больше
+        """
+        self.bins = bins
+        self.frames = 0
+        self.slots = 0
+        self.buff = np.zeros(sens_num)  # сумма сообщений каждого сенсора по слотам
+        self.sensor = _Moments(sens_num)
+        self.backlog = _Moments(1)
+        self.histogram = np.zeros((sens_num, bins), dtype=np.int64)
+        self.arrived = [deque([0] * int(k)) for k in sensors_out]  # моменты появления сообщений в системе
+        self.delivered = 0
+        self.sojourn_sum = 0
+        self.quantiles = [P2Quantile(q) for q in quantiles]
+
+    def add_frame(self, sensors_out, events, compiled):
+        """
+        Добавляет фрейм
+        :param sensors_out: уходящие сообщения сенсоров в начале фрейма
+        :param events: номера слотов и номера сенсоров без БС для каждого пришедшего за фрейм сообщения
+        :param compiled: фрейм после compile_frame
+        """
+        length, counts, offsets, sums = compiled
+        slots, sensors = events
+        sensors = sensors + 1
+        sent = np.minimum(sensors_out, counts)
+
+        self.buff += length * sensors_out - sums[offsets[:-1] + sent]
+        self.buff += np.bincount(sensors, weights=length - slots, minlength=len(self.buff))
+
+        # слоты уходов: разности накопленных сумм compile_frame равны length - слот ухода
+        senders = np.repeat(np.arange(len(sent)), sent)
+        index = np.repeat(offsets[:-1], sent) + np.arange(len(senders)) - np.repeat(np.cumsum(sent) - sent, sent) + 1
+        departures = self.slots + length - (sums[index] - sums[index - 1])
+        for sensor, departure in zip(senders.tolist(), departures.tolist()):
+            self._deliver(departure - self.arrived[sensor].popleft())
+        for sensor, slot in zip(sensors.tolist(), (self.slots + slots).tolist()):
+            self.arrived[sensor].append(slot)
+
+        end = sensors_out - sent + np.bincount(sensors, minlength=len(self.buff))
+        self._frame_end(end, 1)
+        self.frames += 1
+        self.slots += length
+
+    def add_idle(self, length, frames):
+        """Добавляет frames фреймов длины length, в которых в системе нет сообщений"""
+        self._frame_end(np.zeros(len(self.buff), dtype=np.int64), frames)
+        self.frames += frames
+        self.slots += length * frames
+
+    def _deliver(self, sojourn):
+        self.delivered += 1
+        self.sojourn_sum += sojourn
+        for quantile in self.quantiles:
+            quantile.add(sojourn)
+
+    def _frame_end(self, end, frames):
+        self.sensor.add(end, frames)
+        self.backlog.add(np.array([end.sum()]), frames)
+        self.histogram[np.arange(len(end)), np.minimum(end, self.bins - 1)] += frames
+
+    def result(self, diverged=False):
+        """
+        :param diverged: моделирование остановлено из-за переполнения
+        :return: SimulationStats
+        """
+        slots = max(self.slots - 1, 1)
+        return SimulationStats(
+            mean=float('inf') if diverged else self.buff.sum() / slots,
+            sensor_mean=self.buff / slots,
+            sensor_var=self.sensor.variance(),
+            sensor_max=self.sensor.max,
+            histogram=self.histogram,
+            backlog_mean=float(self.backlog.mean[0]),
+            backlog_var=float(self.backlog.variance()[0]),
+            backlog_max=int(self.backlog.max[0]),
+            delivered=self.delivered,
+            sojourn_mean=self.sojourn_sum / self.delivered if self.delivered else float('nan'),
+            sojourn_quantiles={quantile.q: quantile.value() for quantile in self.quantiles},
+            frames=self.frames,
+            slots=self.slots,
+            diverged=diverged,
+        )
+
+
+class _Moments(object):
+    """Среднее, дисперсия и максимум векторов значений (алгоритм Уэлфорда)"""
+
+    def __init__(self, size):
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.max = np.zeros(size, dtype=np.int64)
+
+    def add(self, values, times=1):
+        """Добавляет вектор значений times раз"""
+        count = self.count + times
+        delta = values - self.mean
+        self.mean = self.mean + delta * times / count
+        self.m2 = self.m2 + delta ** 2 * self.count * times / count
+        self.max = np.maximum(self.max, values)
+        self.count = count
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.zeros_like(self.m2)
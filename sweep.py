@@ -0,0 +1,129 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import main
+from adjacency import SparseAdjacency, as_adjacency
+from schedule import Schedule
+from schedule_cache import ScheduleCache
+from stats import SimulationStats
+from validate import validate_log
+
+# топология и расписание, общие для задач процесса-исполнителя
+_shared = {}
+
+
+def share_arrays(arrays):
+    """
+    Копирует массивы в разделяемую память
+    :param arrays: словарь имя -> массив numpy
+    :return: список открытых блоков памяти и описание массивов для attach_arrays
+    """
+    blocks, specs = [], {}
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[key] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def attach_arrays(specs):
+    """
+    Открывает массивы из разделяемой памяти без копирования
+    :param specs: описание массивов от share_arrays
+    :return: список открытых блоков памяти и словарь имя -> массив numpy
+    """
+    blocks, arrays = [], {}
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return blocks, arrays
+
+
+def _init_worker(specs, schedule_path):
+    """
+    Подключает процесс-исполнитель к топологии и расписанию в разделяемой памяти;
+    расписание из файла отображается в память
+    """
+    blocks, arrays = attach_arrays(specs)
+    _shared['blocks'] = blocks
+    _shared['adj'] = SparseAdjacency(arrays.pop('indptr'), arrays.pop('indices'))
+    _shared['frame'] = Schedule.load(schedule_path) if schedule_path else Schedule(**arrays)
+    # расписания адаптивного режима общие для всех точек процесса
+    _shared['cache'] = ScheduleCache()
+
+
+def _run_point(prb, adaptation, num_of_frames, seed, options):
+    """Моделирует одну точку сетки"""
+    rng = np.random.default_rng(seed)
+    return main.sens_graph_with_prob(_shared['adj'], prb=prb, num_of_frames=num_of_frames,
+                                     adaptation=adaptation, frame=_shared['frame'], rng=rng,
+                                     cache=_shared['cache'], **options)
+
+
+def run_sweep(adj, probabilities, adaptation_frames, num_of_frames=1000, seed=None, workers=None,
+              skip_above=None, validate=True, schedule=None, **options):
+    """
+    Моделирует буфер сенсоров для всех пар (вероятность, порядок адаптации) в пуле процессов.
+
+    Топология и начальное расписание строятся один раз и передаются исполнителям через
+    разделяемую память. Каждая точка получает свой поток случайных чисел из SeedSequence(seed),
+    поэтому результат при одном seed не зависит от числа процессов и порядка выполнения.
+    :param adj: SparseAdjacency или матрица смежности сенсорной сети
+    :param probabilities: вероятности появления сообщения
+    :param adaptation_frames: порядки адаптации, 0 - без адаптации
+    :param num_of_frames: количество фреймов моделирования
+    :param seed: начальное значение для потоков случайных чисел
+    :param workers: количество процессов, по умолчанию число ядер
+    :param skip_above: если среднее для порядка адаптации больше 0 превысило это значение,
+                       еще не начатые точки с этим порядком и большей вероятностью отменяются
+    :param validate: проверить начальное расписание (validate.validate_log) перед моделированием
+    :param schedule: начальное расписание: Schedule или файл Schedule.save, который исполнители
+                     отображают в память; по умолчанию строится main.rasp_schedule
+    :return: словарь (вероятность, порядок адаптации) -> среднее количество сообщений в системе,
+             без отмененных точек
+    :param options: остальные параметры sens_graph_with_prob (event_driven, rel_width, overflow и др.)
+    """
+    adj = as_adjacency(adj)
+    schedule_path = schedule if isinstance(schedule, str) else None
+    if schedule_path:
+        schedule = Schedule.load(schedule_path)
+    elif schedule is None:
+        schedule = main.rasp_schedule(adj)
+    if validate:
+        validate_log(adj, schedule)
+
+    points = [(prb, adaptation) for prb in probabilities for adaptation in adaptation_frames]
+    seeds = np.random.SeedSequence(seed).spawn(len(points))
+
+    arrays = dict(indptr=adj.indptr, indices=adj.indices)
+    if not schedule_path:
+        arrays.update(schedule.arrays())
+    blocks, specs = share_arrays(arrays)
+    results = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                 initializer=_init_worker, initargs=(specs, schedule_path)) as pool:
+            futures = {pool.submit(_run_point, prb, adaptation, num_of_frames, point_seed, options):
+                       (prb, adaptation) for (prb, adaptation), point_seed in zip(points, seeds)}
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                prb, adaptation = futures[future]
+                results[prb, adaptation] = future.result()
+                # при stats=True результат - SimulationStats
+                result = results[prb, adaptation]
+                mean = result.mean if isinstance(result, SimulationStats) else float(result)
+                if skip_above is not None and adaptation > 0 and mean > skip_above:
+                    for other, (other_prb, other_adaptation) in futures.items():
+                        if other_adaptation == adaptation and other_prb > prb:
+                            other.cancel()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return results
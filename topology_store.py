@@ -0,0 +1,152 @@
+import json
+import os
+import struct
+import zipfile
+from random import Random
+
+import numpy as np
+from adjacency import SparseAdjacency
+from graph_gen import graph_generator, grid_generator, tree_generator
+
+# генераторы сетей: имя -> (функция, принимает ли seed)
+GENERATORS = {
+    'graph': (graph_generator, True),
+    'tree': (tree_generator, True),
+    'grid': (grid_generator, False),
+}
+
+
+def save_topology(path, adj, generator=None, params=None, seed=None):
+    """
+    Сохраняет сеть в файл npz без сжатия: массивы CSR, координаты сенсоров (если есть)
+    и описание - генератор, его параметры и seed - в виде строки JSON
+    :param path: имя файла
+    :param adj: SparseAdjacency
+    :param generator: имя генератора из GENERATORS
+    :param params: параметры генератора
+    :param seed: seed генератора
+    """
+    arrays = dict(indptr=np.asarray(adj.indptr), indices=np.asarray(adj.indices),
+                  meta=np.array(json.dumps(dict(generator=generator, params=params or {}, seed=seed))))
+    if adj.coords is not None:
+        arrays['coords'] = np.asarray(adj.coords)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _member_array(path, archive, name):
+    """
+    Отображает в память массив из npz без сжатия: данные члена архива лежат в файле
+    подряд сразу после локального заголовка zip и заголовка npy
+    """
+    info = archive.getinfo(name + '.npy')
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset)
+        header = f.read(30)
+        name_len, extra_len = struct.unpack('<HH', header[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if dtype.hasobject or not np.prod(shape):
+        return None
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape, order='F' if fortran_order else 'C')
+
+
+def load_topology(path, mmap=True):
+    """
+    Загружает сеть из файла save_topology
+    :param path: имя файла
+    :param mmap: отобразить массивы в память только для чтения, без копирования
+    :return: SparseAdjacency и описание (генератор, параметры, seed)
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive:
+        names = [member[:-len('.npy')] for member in archive.namelist()]
+        if mmap:
+            for name in names:
+                if name != 'meta':
+                    array = _member_array(path, archive, name)
+                    if array is not None:
+                        arrays[name] = array
+    with np.load(path, allow_pickle=False) as data:
+        for name in names:
+            if name not in arrays:
+                arrays[name] = data[name]
+    meta = json.loads(str(arrays.pop('meta')))
+    return SparseAdjacency(arrays['indptr'], arrays['indices'], arrays.get('coords')), meta
+
+
+class TopologyStore(object):
+    """
+    Каталог сгенерированных сетей.
+
+    Сеть определяется генератором, его параметрами и seed, по ним строится имя файла.
+    Если сеть уже есть в каталоге, она загружается (по умолчанию - отображением в память),
+    иначе генерируется и сохраняется, поэтому эксперименты на одном наборе сетей
+    не генерируют их заново.
+    """
+
+    def __init__(self, root):
+        """
+        :param root: каталог хранилища, создается при необходимости
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def name(generator, seed=None, **params):
+        """Имя сети по генератору, параметрам и seed"""
+        parts = [generator] + ['{}{}'.format(key, params[key]) for key in sorted(params)]
+        if seed is not None:
+            parts.append('seed{}'.format(seed))
+        return '_'.join(parts)
+
+    def path(self, name):
+        return os.path.join(self.root, name + '.npz')
+
+    def __contains__(self, name):
+        return os.path.exists(self.path(name))
+
+    def names(self):
+        """Имена всех сетей хранилища"""
+        return sorted(file[:-len('.npz')] for file in os.listdir(self.root) if file.endswith('.npz'))
+
+    def save(self, name, adj, generator=None, params=None, seed=None):
+        """Сохраняет сеть под именем name"""
+        save_topology(self.path(name), adj, generator, params, seed)
+
+    def load(self, name, mmap=True):
+        """
+        :return: SparseAdjacency и описание сети
+        """
+        return load_topology(self.path(name), mmap)
+
+    def get(self, generator, seed=None, mmap=True, **params):
+        """
+        Загружает сеть или генерирует и сохраняет ее.
+        Без seed генерируется новая сеть со случайным seed, который сохраняется в описании
+        :param generator: имя генератора из GENERATORS
+        :param seed: seed генератора, у решетки не используется
+        :param mmap: отобразить массивы в память
+        :param params: параметры генератора, например n=1000 или num=21
+        :return: SparseAdjacency и описание сети
+        """
+        if generator not in GENERATORS:
+            raise ValueError("Unknown generator '{}'".format(generator))
+        function, seeded = GENERATORS[generator]
+        if not seeded:
+            seed = None
+        elif seed is None:
+            seed = Random().getrandbits(32)
+        name = self.name(generator, seed, **params)
+        if name not in self:
+            adj = function(seed=seed, **params) if seeded else function(**params)
+            self.save(name, adj, generator, params, seed)
+        return self.load(name, mmap)
@@ -1,24 +1,37 @@
 import unittest
+from random import Random
+
+import numpy as np
+from adjacency import as_adjacency
+from graph_gen import graph_generator
+from main import rasp_incremental
+from partition import rasp_partitioned
+from schedule import Schedule
+from stats import P2Quantile
 
 
 class CreateBalanceScheduleTestCase(unittest.TestCase):
 
-    def __init__(self, adj_matrix, schedule):
-        super(CreateBalanceScheduleTestCase, self).__init__()
-        self.adj_matrix = adj_matrix
+    def __init__(self, adj_matrix, schedule, log=None, methodName='runTest'):
+        super(CreateBalanceScheduleTestCase, self).__init__(methodName)
+        self.adj_matrix = as_adjacency(adj_matrix)
         self.schedule = schedule
+        self.log = log
 
     def test_len_slot(self):
         for slot in self.schedule:
             self.assertLessEqual(len(slot), 1, "Length of slot can't be more than 1")
 
     def test_direct_path_from_sensor_to_base_station(self):
-        for slot in self.schedule:
-            if slot:
-                self.assertEqual(self.adj_matrix[slot[0]][0], 1,
-                                 "Direct path is not exists for the {} sensor ").format(slot[0])
-                self.assertEqual(self.adj_matrix[0][slot[0]], 1,
-                                 "Direct path is not exists for the {} sensor ").format(slot[0])
+        # на БС сообщение передает сосед БС, а не обязательно источник сообщения
+        if self.log is None:
+            self.skipTest("Transmissions of the schedule are not recorded")
+        for _, source, receive, _ in self.log:
+            if receive == 0:
+                self.assertTrue(self.adj_matrix.has_edge(source, 0),
+                                "Direct path is not exists for the {} sensor ".format(source))
+                self.assertTrue(self.adj_matrix.has_edge(0, source),
+                                "Direct path is not exists for the {} sensor ".format(source))
 
     def test_messages_count_to_base_station(self):
         count = 0
@@ -27,91 +40,236 @@ class CreateBalanceScheduleTestCase(unittest.TestCase):
                 count += 1
         self.assertLessEqual(count, len(self.adj_matrix), "Too many recieves to the base station")
 
+    def test_transmissions(self):
+        if self.log is None:
+            self.skipTest("Transmissions of the schedule are not recorded")
+        validate_log(self.adj_matrix, self.log, frame=self.schedule)
+
+
+class IncrementalScheduleTestCase(unittest.TestCase):
+    """Исправленные расписания IncrementalSchedule проверяются validate_log после каждого изменения"""
+
+    def assertValidSchedule(self, schedule):
+        log = [(slot_num, source, receive, msg) for msg, hops in schedule.hops.items()
+               for slot_num, source, receive in hops]
+        # ожидающие сообщения недостижимых сенсоров в расписание не входят
+        sens_buf = [buf - schedule.waiting.get(i, 0) for i, buf in enumerate(schedule.sens_buf)]
+        validate_log(schedule.graph.adjacency(), log, sens_buf, schedule.frame())
+
+    def test_update(self):
+        rnd = Random(13)
+        schedule = rasp_incremental(graph_generator(60, seed=13))
+        self.assertValidSchedule(schedule)
+        for _ in range(20):
+            schedule.update([0] + [rnd.randint(0, 3) for _ in range(60)])
+            self.assertValidSchedule(schedule)
+
+    def test_churn(self):
+        rnd = Random(24)
+        schedule = rasp_incremental(graph_generator(60, seed=24))
+        for _ in range(60):
+            n = len(schedule.graph)
+            event = rnd.randrange(5)
+            if event == 0:
+                schedule.remove_sensor(rnd.randrange(1, n))
+            elif event == 1:
+                schedule.add_sensor(rnd.sample(range(n), 3), messages=rnd.randint(1, 2))
+            elif event == 2:
+                i = rnd.randrange(1, n)
+                schedule.move_sensor(i, rnd.sample([j for j in range(n) if j != i], 3))
+            elif event == 3:
+                i, j = rnd.sample(range(n), 2)
+                if not schedule.graph.has_edge(i, j):
+                    schedule.add_edge(i, j)
+            else:
+                i = rnd.randrange(n)
+                if schedule.graph.neighbors(i):
+                    schedule.remove_edge(i, rnd.choice(schedule.graph.neighbors(i)))
+            self.assertValidSchedule(schedule)
+
+
+class PartitionedScheduleTestCase(unittest.TestCase):
+    """Объединенное расписание областей проверяется validate_log"""
+
+    def test_merge_logs(self):
+        adj = graph_generator(200, seed=20)
+        sens_buf = [0] + [1 + i % 2 for i in range(200)]
+        log = []
+        frame = rasp_partitioned(adj, list(sens_buf), regions=3, workers=1, log=log)
+        validate_log(adj, log, sens_buf, frame)
+
+
+class P2QuantileTestCase(unittest.TestCase):
+    """Оценки P² сравниваются с точными квантилями выборки"""
+
+    def test_quantiles(self):
+        values = np.random.default_rng(17).exponential(10.0, size=20000)
+        for q in (0.5, 0.9, 0.99):
+            estimate = P2Quantile(q)
+            for x in values.tolist():
+                estimate.add(x)
+            exact = np.quantile(values, q)
+            self.assertAlmostEqual(estimate.value(), exact, delta=0.03 * exact,
+                                   msg="P2 estimate of the {} quantile is too far".format(q))
+
+    def test_few_values(self):
+        estimate = P2Quantile(0.5)
+        self.assertTrue(np.isnan(estimate.value()))
+        for x in (3, 1, 2):
+            estimate.add(x)
+        self.assertEqual(estimate.value(), 2)
+
+
+class ValidateError(Exception):
+    pass
+
+
+def validate_log(adj_matrix, log, sens_buf=list(), frame=None):
+    """
+    Проверка правильности расписания по всем его передачам сразу, без перебора по слотам
+    1) Передачи только по связям сети
+    2) Конфликты в слотах: передачи s -> r и s' -> r' одного слота конфликтуют, если r - сосед s'
+       или сам s' (правило interference.SlotLocks, оно симметрично)
+    3) Сообщение передается дальше тем сенсором, который его принял, в одном из следующих слотов,
+       количество сообщений в сенсорах не становится отрицательным
+    4) Все сообщения доходят до БС, фрейм (если задан) совпадает с доставками передач
+    :param adj_matrix: SparseAdjacency или матрица смежности
+    :param log: передачи (слот, передатчик, приемник, сообщение), см. rasp_create, или Schedule
+    :param sens_buf: количество сообщений в каждом сенсоре, по которому строилось расписание
+    :param frame: фрейм от rasp_create
+    :return: True, если расписание правильное, иначе выкидывается ValidateError
+    """
+    adj = as_adjacency(adj_matrix)
+    n = len(adj)
+    if isinstance(log, Schedule):
+        log = log.log()
+    if not sens_buf:
+        sens_buf = [0 if i == 0 else 1 for i in range(n)]
+    log = np.asarray(log, dtype=np.int64).reshape(-1, 4)
+    if not len(log):
+        if any(sens_buf[1:]) or (frame is not None and any(frame)):
+            raise ValidateError("Сообщения не дошли до БС")
+        return True
+    slot, source, receive, msg = log.T
+    indptr, indices = np.asarray(adj.indptr, dtype=np.int64), np.asarray(adj.indices, dtype=np.int64)
+    degrees = np.diff(indptr)
+
+    # 1) строки CSR отсортированы, поэтому ключи i * n + j всех связей упорядочены
+    links = np.repeat(np.arange(n, dtype=np.int64), degrees) * n + indices
+    keys = source * n + receive
+    found = np.searchsorted(links, keys)
+    bad = np.flatnonzero((found == len(links)) | (links[np.minimum(found, len(links) - 1)] != keys))
+    if len(bad):
+        raise ValidateError("Такого маршрута не существует: слот {}, {} -> {}".format(*log[bad[0], :3]))
+
+    # 2) конфликты передач внутри слотов
+    conflict = _find_conflict(n, slot, source, receive, indptr, indices)
+    if conflict >= 0:
+        raise ValidateError("Возникла коллизия: слот {}, передача {} -> {}".format(*log[conflict, :3]))
+
+    # 3) передачи каждого сообщения по порядку слотов
+    order = np.lexsort((slot, msg))
+    slot, source, receive, msg = slot[order], source[order], receive[order], msg[order]
+    same = msg[1:] == msg[:-1]
+    bad = np.flatnonzero(same & ((source[1:] != receive[:-1]) | (slot[1:] <= slot[:-1])))
+    if len(bad):
+        raise ValidateError("Сообщение {} передает не принявший его сенсор или раньше приема: слот {}".format(
+            msg[bad[0] + 1], slot[bad[0] + 1]))
+    first = np.concatenate(([True], ~same))
+    origins = np.bincount(source[first], minlength=n)
+    if (origins[1:] != np.asarray(sens_buf[1:], dtype=np.int64)).any() or origins[0]:
+        sensor = np.flatnonzero(origins != np.asarray([0] + list(sens_buf[1:]), dtype=np.int64))[0]
+        raise ValidateError("Из сенсора {} уходит {} сообщений вместо {}".format(
+            sensor, origins[sensor], sens_buf[sensor] if sensor else 0))
+
+    # количество сообщений сенсора: принятое в слоте можно передать только в следующем,
+    # поэтому в одном слоте передачи учитываются раньше приемов
+    sensor = np.concatenate((source, receive))
+    time = np.concatenate((2 * slot, 2 * slot + 1))
+    change = np.concatenate((-np.ones(len(source), dtype=np.int64), np.ones(len(receive), dtype=np.int64)))
+    order = np.lexsort((time, sensor))
+    sensor, change = sensor[order], change[order]
+    total = np.cumsum(change)
+    begin = np.searchsorted(sensor, np.arange(n))
+    buffers = total - np.concatenate(([0], total))[begin][sensor] + np.asarray(sens_buf, dtype=np.int64)[sensor]
+    bad = np.flatnonzero((buffers < 0) & (sensor > 0))
+    if len(bad):
+        raise ValidateError("Передает пустой сенсор {}".format(sensor[bad[0]]))
+
+    # 4) последняя передача каждого сообщения - на БС
+    last = np.concatenate((~same, [True]))
+    if (receive[last] != 0).any():
+        raise ValidateError("Сообщение {} не дошло до БС".format(msg[last][receive[last] != 0][0]))
+    if frame is not None:
+        delivered = sorted(zip(slot[last].tolist(), source[first].tolist()))
+        if delivered != sorted((k, i) for k, frame_slot in enumerate(frame) for i in frame_slot):
+            raise ValidateError("Фрейм не совпадает с доставками передач на БС")
+    return True
+
+
+def _find_conflict(n, slot, source, receive, indptr, indices, table_size=1 << 22):
+    """
+    Ищет конфликт: для каждой передачи приемники других передач слота ищутся среди передатчика
+    и его соседей. Слоты обрабатываются группами, приемники группы отмечаются в таблице
+    слот группы x сенсор, поэтому проверка соседа - одно обращение к таблице.
+    :param table_size: наибольший размер таблицы
+    :return: номер передачи с конфликтом, -1 без конфликтов
+    """
+    # два приемника в одном слоте - конфликт, дальше приемники слотов различны
+    keys = slot * n + receive
+    order = np.argsort(keys, kind='stable')
+    repeated = np.flatnonzero(keys[order][1:] == keys[order][:-1])
+    if len(repeated):
+        return int(order[repeated[0] + 1])
+
+    # сенсоры и их соседи в формате CSR: соседи сенсора, затем он сам
+    degrees = np.diff(indptr)
+    closed_ptr = indptr + np.arange(n + 1)
+    closed = np.empty(len(indices) + n, dtype=indices.dtype)
+    own = closed_ptr[1:] - 1
+    mask = np.ones(len(closed), dtype=bool)
+    mask[own] = False
+    closed[mask] = indices
+    closed[own] = np.arange(n)
+
+    order = np.argsort(slot, kind='stable')
+    counts = degrees[source[order]] + 1
+    ends = np.cumsum(counts)
+    hop = np.repeat(order, counts)
+    neighbors = closed[np.repeat(closed_ptr[source[order]] - ends + counts, counts) + np.arange(ends[-1])]
 
+    span = max(1, table_size // n)
+    table = np.zeros(span * n, dtype=bool)
+    # границы групп по span слотов в передачах, упорядоченных по слотам
+    bounds = np.searchsorted(slot[order], np.arange(0, slot.max() + span + 1, span))
+    for chunk, (first, last) in enumerate(zip(bounds[:-1], bounds[1:])):
+        if first == last:
+            continue
+        base = chunk * span
+        marks = (slot[order[first:last]] - base) * n + receive[order[first:last]]
+        table[marks] = True
+        begin, end = (ends[first - 1] if first else 0), ends[last - 1]
+        group = hop[begin:end]
+        found = table[(slot[group] - base) * n + neighbors[begin:end]] & (neighbors[begin:end] != receive[group])
+        table[marks] = False
+        bad = np.flatnonzero(found)
+        if len(bad):
+            return int(group[bad[np.argmin(slot[group[bad]])]])
+    return -1
 
-# class validateError(Exception):
-#     pass
-#
-#
-# def validateFunc(graph, rasp, log=False):
-#     # Типо документация
-#     """
-#     Процедура проверки правильности расписания
-#     1) Проверка слотов на конфликты
-#     2) Проверка передачи всех сообщений на БС по окончанию валидации
-#     3) Проверка корректной передачи сообщений
-#     :param graph:  Входной граф сенсорной сети
-#     :param rasp: Расписание построенное для сенсорной сети
-#     :param log: Вывод логов
-#     :return: в случае успешной валидации True, если расписание не правильное выкидывается ошибка
-#     """
-#     count_nodes = len(graph)  # Количество сенсоров в сети
-#     weight_nodes = [1 for i in range(count_nodes)]  # Сообщения в сенсорах
-#     len_rasp = len(rasp)
-#     if log:
-#         print("Начало валидации расписания")
-#     for i in range(len_rasp):
-#         if log:
-#             print("-------------\nВалидация ", i, " шага расписания")
-#         weight_nodes = stepValidation(graph, rasp[i], weight_nodes, log)
-#         if weight_nodes is False:
-#             print(graph)
-#             raise validateError("Произошла ошибка на " + str(i) + " шаге")
-#     if max(weight_nodes[1:]) > 0:
-#         return False
-#         # raise validateError("Не все сообщения переданы на БС "+str(weight_nodes))
-#     if log:
-#         print("Валидация завершена")
-#     return True
-#
-#
-# def stepValidation(graph, step, weight_nodes, log):
-#     blocked_transmit = []  # заблокированные перeдатчики
-#     blocked_receive = []  # заблокированные приёмники
-#     len_step = len(step)
-#     for i in range(len_step):
-#         if log:
-#             print("Передатчик ", step[i][0])
-#             print("Приёмник ", step[i][1])
-#         if step[i][0] == step[i][1]:  # Проверка на то что приёмник и передатчик не совпадают
-#             return False
-#             # raise validateError("Приёмник и передатчик совпадает "+str(step[i][0]))
-#         if step[i][0] in blocked_transmit or step[i][1] in blocked_receive:  # Проверка на конфликты
-#             return False
-#             # raise validateError("Возникла коллизия, заблокированные сенсоры "+str(conflict))
-#         if graph[step[i][0]][step[i][1]] == 0:
-#             return False
-#             # raise validateError("Такого маршрута не существует")
-#         weight_nodes[step[i][0]] -= 1
-#         weight_nodes[step[i][1]] += 1
-#         blocked_receive.append(step[i][0])  # Блокируем текущие ноды на приём и передачу
-#         blocked_receive.append(step[i][1])
-#         blocked_transmit.append(step[i][0])
-#         blocked_transmit.append(step[i][1])
-#         if weight_nodes[step[i][0]] < 0 or weight_nodes[
-#             step[i][1]] < 0:  # Валидация что бы пустой сенсор не передавал сообщения
-#             # raise validateError("Передаёт сообщение пустой сенсор")
-#             return False
-#         # for j in range(len(graph)): #Матрица конфликтов
-#         #     if (graph[step[i][0]][j]==1):
-#         #         conflict.append(j)
-#         for j in range(len(graph)):  # Блокировки
-#             if graph[step[i][1]][j] > 0:  # блокируем передатчики
-#                 blocked_transmit.append(j)
-#             if graph[step[i][0]][j] > 0:  # блокируем приёмники
-#                 blocked_receive.append(j)
-#         if log:
-#             print(weight_nodes)
-#     return weight_nodes
 
 if __name__ == "__main__":
     from main import rasp_create
-    from graph_gen import graph_generator
 
     adj = graph_generator(100)
-    sch = rasp_create(adj, balance=True)
+    log = []
+    sch = rasp_create(adj, balance=True, log=log)
 
     suite = unittest.TestSuite()
-    suite.addTest(CreateBalanceScheduleTestCase(adj, sch))
+    for name in unittest.TestLoader().getTestCaseNames(CreateBalanceScheduleTestCase):
+        suite.addTest(CreateBalanceScheduleTestCase(adj, sch, log, name))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(IncrementalScheduleTestCase))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(PartitionedScheduleTestCase))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(P2QuantileTestCase))
 
-    unittest.TextTestRunner.run(suite)
+    unittest.TextTestRunner().run(suite)